@@ -20,6 +20,8 @@ import yaml
 
 import athome
 from athome.core import Core
+from athome.lib import profiler
+from athome.system import add_state_listener, remove_state_listener
 
 DEFAULT_CONFIG = './config.yml'
 
@@ -40,8 +42,10 @@ def init_env(config_file):
     if not os.access(config_file, os.R_OK):
         raise FileNotFoundError("Configuration file {} not accessible".
                                     format(config_file))
-    config = yaml.safe_load(open(config_file, 'rb'))
-    env = process_env(config['env'])
+    with profiler.phase('yaml_load'):
+        config = yaml.safe_load(open(config_file, 'rb'))
+    with profiler.phase('process_env'):
+        env = process_env(config['env'])
     return env, config
 
 
@@ -106,6 +110,7 @@ def parse_args():
     parser.add_argument('-d', '--detach', action='store_true', help='Run in background')
     parser.add_argument('-c', '--config', action='store', help='Specify configuration file', default=DEFAULT_CONFIG)
     parser.add_argument('-v', '--verbosity', action='store_true', help='Turn on verbosity')
+    parser.add_argument('--profile-startup', action='store_true', help='Write a startup profile into run_dir')
     return parser.parse_args()
 
 
@@ -120,9 +125,27 @@ def do_fork():
         os.umask(0)
 
 
+def install_profile_report(core, env):
+    """Write startup profile into run_dir if core stops before startup completes
+
+    On a complete startup the report is written by core itself.
+    """
+
+    def write_report(module, state):
+        if module is core and (core.is_closed() or core.is_failed()):
+            remove_state_listener(write_report)
+            remove_state_listener(profiler.state_changed)
+            profiler.write_report(env['run_dir'])
+
+    if profiler.current():
+        add_state_listener(write_report)
+
+
 async def main(loop, env, config):
     core = Core()
-    core.initialize(loop, env, config)
+    install_profile_report(core, env)
+    with profiler.phase('core_initialize'):
+        core.initialize(loop, env, config)
     install_signal_handlers(core)
     result = athome.PROCESS_OUTCOME_KO
     try:
@@ -148,7 +171,11 @@ if WIN32:
     asyncio.set_event_loop(loop)
 
 args = parse_args()
-env, config = init_env(args.config)
+if args.profile_startup:
+    profiler.enable()
+    add_state_listener(profiler.state_changed)
+with profiler.phase('init_env'):
+    env, config = init_env(args.config)
 loop = asyncio.get_event_loop()
 loop.set_debug(config['asyncio']['debug'])
 main_task = asyncio.ensure_future(main(loop, env, config))
@@ -11,7 +11,7 @@ __all__ = [
     'subsystem'
 ]
 
-from collections import namedtuple
+import sys
 
 MESSAGE_EVT, \
 MESSAGE_START, \
@@ -23,4 +23,46 @@ MESSAGE_NONE = range(6)
 PROCESS_OUTCOME_OK = 0
 PROCESS_OUTCOME_KO = -1
 
-Message = namedtuple('Message', ('type', 'value', 'data'))
+EVENT_NONE = -1
+
+_event_ids = dict()
+_event_names = []
+
+
+def event_id(name):
+    """Return the small int identifying event 'name', registering it"""
+
+    try:
+        result = _event_ids[name]
+    except KeyError:
+        name = sys.intern(name)
+        result = _event_ids[name] = len(_event_names)
+        _event_names.append(name)
+    return result
+
+
+def event_name(evt_id):
+    return _event_names[evt_id]
+
+
+class Message:
+    """Message exchanged through SystemModule queues
+
+    For MESSAGE_EVT messages 'value' is the event name and 'event' its
+    interned id, 'count' is the number of events collapsed into a single
+    coalesced message.
+
+    """
+
+    __slots__ = ('type', 'value', 'data', 'count', 'event')
+
+    def __init__(self, type_, value, data=None, count=1):
+        self.type = type_
+        self.value = value
+        self.data = data
+        self.count = count
+        self.event = event_id(value) if type_ == MESSAGE_EVT else EVENT_NONE
+
+    def __repr__(self):
+        return 'Message(type={}, value={!r}, data={!r}, count={})'.format(
+            self.type, self.value, self.data, self.count)
@@ -5,6 +5,9 @@
 import asyncio
 import importlib
 import logging
+import time
+from collections import OrderedDict
+from functools import partial
 
 from athome import Message,\
     MESSAGE_EVT,\
@@ -13,8 +16,12 @@ from athome import Message,\
     MESSAGE_NONE,\
     MESSAGE_SHUTDOWN
 from athome.system import SystemModule
-from athome.lib.locator import Cache
-from athome.lib.management import managed
+from athome.lib.coalescer import Coalescer
+from athome.lib import profiler
+from athome.lib.dependencies import resolve_levels, split_eager
+from athome.lib.locator import Cache, Lazy
+from athome.lib.management import managed, volatile
+from athome.lib.routing import EventRouter
 
 SHUTDOWN_TIMEOUT = 2
 
@@ -35,33 +42,125 @@ class Core(SystemModule):
     def __init__(self):
         if not self.__initialized:
             super().__init__('core')
-            self._subsystems = {}
+            self._subsystems = OrderedDict()
+            self._dependencies = dict()
+            self._start_requests = set()
+            self._startup = OrderedDict()
+            self._startup_origin = None
+            self._startup_logged = False
+            self._lazy = dict()
+            self._lazy_triggers = EventRouter()
             self.loop = None
             self.event_task = None
             self._cache = Cache()
+            self._router = EventRouter()
+            self._coalescer = None
             self.__initialized = True
 
     def on_initialize(self):
+        coalesce = self.config.get('core', {}).get('coalesce')
+        if coalesce:
+            self._coalescer = Coalescer(**coalesce)
+
         # Load _subsystems
         
+        self._startup_origin = time.monotonic()
         subsystems = self.config['subsystem']
-        for name in [name for name in subsystems
-                     if subsystems[name]['enable']
-                     ]:
-            module_class = subsystems[name]['class']
+        enabled = [name for name in subsystems if subsystems[name]['enable']]
+        classes = dict()
+
+        def depends_of(name):
             try:
-                subsystem_class = self._load_class(module_class)
-                subsystem = subsystem_class(name)
-                self._subsystems[name] = subsystem
-                subsystem.initialize(
-                    self.loop, 
-                    self.env,
-                    self.config['subsystem'][name]['config']
-                )
-                self._cache.register('subsystem/{}'.format(name), subsystem)
+                classes[name] = self._load_class(subsystems[name]['class'])
             except Exception as ex:
                 LOGGER.exception('Error in initialization')
                 raise ex
+            return self._declared_depends(name, classes[name])
+
+        lazy = {name for name in enabled if subsystems[name].get('lazy')}
+        eager, lazy = split_eager(enabled, lazy, depends_of)
+        for name in lazy:
+            self._register_lazy(name, subsystems[name])
+        for name in eager:
+            self._dependencies[name] = self._resolve_depends(name, classes[name], eager)
+
+        for level, names in enumerate(resolve_levels(self._dependencies)):
+            for name in names:
+                try:
+                    subsystem = self._initialize_subsystem(name, classes[name], level)
+                    self._cache.register('subsystem/{}'.format(name), subsystem)
+                except Exception as ex:
+                    LOGGER.exception('Error in initialization')
+                    raise ex
+
+    def _declared_depends(self, name, subsystem_class):
+        return self.config['subsystem'][name].get('depends', subsystem_class.DEPENDS)
+
+    def _resolve_depends(self, name, subsystem_class, available):
+        """Dependencies of 'name' among 'available', warn about the others"""
+
+        result = []
+        for dep in self._declared_depends(name, subsystem_class):
+            if dep in available:
+                if dep != name:
+                    result.append(dep)
+            else:
+                LOGGER.warning('%s depends on %s, which is not enabled', name, dep)
+        return result
+
+    def _register_lazy(self, name, subsystem_config):
+        """Register a placeholder activating subsystem 'name' upon lookup"""
+
+        self._lazy[name] = subsystem_config
+        for pattern in subsystem_config.get('triggers', ()):
+            self._lazy_triggers.subscribe(pattern, name)
+        self._cache.register('subsystem/{}'.format(name),
+                             Lazy(partial(self._activate, name)))
+
+    def _activate(self, name):
+        """Import and initialize lazy subsystem 'name'
+
+        Invoked by the Cache upon first lookup of 'subsystem/<name>', lazy
+        dependencies are activated first. If Core is already running the
+        subsystem is started straight away. Triggers are dropped only once
+        the subsystem is initialized, a failed activation is retried upon
+        the next trigger or lookup.
+
+        """
+
+        LOGGER.info('activating lazy subsystem %s', name)
+        subsystem_class = self._load_class(self.config['subsystem'][name]['class'])
+        depends = self._resolve_depends(name, subsystem_class, self.subsystems)
+        for dep in depends:
+            # activate lazy dependencies, if any
+            self._cache.lookup('subsystem/{}'.format(dep))
+        self._dependencies[name] = depends
+        result = self._initialize_subsystem(name, subsystem_class, None)
+        self._lazy_triggers.unsubscribe_all(name)
+        if self.is_running():
+            self.request_start(result)
+        return result
+
+    def _initialize_subsystem(self, name, subsystem_class, level):
+        begin = time.monotonic()
+        subsystem = subsystem_class(name)
+        self._subsystems[name] = subsystem
+        self.subscribe(subsystem, *subsystem.subscriptions())
+        subsystem.configure_queue(**self.config['subsystem'][name].get('queue', {}))
+        subsystem.initialize(
+            self.loop, 
+            self.env,
+            self.config['subsystem'][name]['config']
+        )
+        self._startup[name] = {
+            'level': level,
+            'depends': self._dependencies[name],
+            'initialize': time.monotonic() - begin,
+            'start_requested': None,
+            'start': None,
+            'running': None
+        }
+        return subsystem
 
     @staticmethod
     def _load_class(class_name):
@@ -73,6 +172,70 @@ class Core(SystemModule):
         assert issubclass(class_, SubsystemModule)
         return class_
 
+    def request_start(self, subsystem):
+        """Start 'subsystem' as soon as all its dependencies are running"""
+
+        timing = self._startup.get(subsystem.name)
+        if timing is None:
+            LOGGER.warning('start requested by unknown subsystem %s', subsystem.name)
+        else:
+            timing['start_requested'] = self._elapsed()
+            self._start_requests.add(subsystem.name)
+            self._start_ready()
+
+    def subsystem_started(self, subsystem):
+        """Notify that 'subsystem' is running, start its dependents"""
+
+        timing = self._startup.get(subsystem.name)
+        if timing and timing['running'] is None:
+            timing['running'] = self._elapsed()
+            if not self._startup_logged and self.startup_complete():
+                self._startup_logged = True
+                self._log_startup()
+                if profiler.current():
+                    profiler.write_report(self.env['run_dir'])
+        self._start_ready()
+
+    def subsystem_failed(self, subsystem):
+        """Notify that 'subsystem' failed, fail the dependents waiting for it"""
+
+        if subsystem.name in self._startup:
+            self._start_requests.discard(subsystem.name)
+            self._start_ready()
+
+    def startup_complete(self):
+        """True when every initialized subsystem has been running"""
+
+        return self.is_running() and \
+            all(t['running'] is not None for t in self._startup.values())
+
+    def _start_ready(self):
+        for name, subsystem in self._subsystems.items():
+            if name not in self._start_requests:
+                continue
+            depends = [self._subsystems[dep] for dep in self._dependencies[name]]
+            failed = [dep.name for dep in depends if dep.is_failed()]
+            if failed:
+                self._start_requests.discard(name)
+                LOGGER.error('subsystem %s not started, failed dependencies: %s',
+                             name, ', '.join(failed))
+                subsystem.fail()
+            elif all(dep.is_running() for dep in depends):
+                self._start_requests.discard(name)
+                if subsystem.is_ready():
+                    self._startup[name]['start'] = self._elapsed()
+                    subsystem.start()
+
+    def _elapsed(self):
+        return time.monotonic() - self._startup_origin
+
+    def _log_startup(self):
+        LOGGER.info('subsystems running after %.3fs', self._elapsed())
+        for name, timing in self._startup.items():
+            LOGGER.info('  %-12s level %s init %.3fs start %.3fs running %.3fs',
+                        name, timing['level'], timing['initialize'],
+                        timing['start'] or 0, timing['running'])
+
     async def run_forever(self):
         """Execute run coroutine until stopped"""
         
@@ -82,26 +245,76 @@ class Core(SystemModule):
     async def message_cycle(self):
         message = Message(MESSAGE_NONE, None, None)
         while message.type != MESSAGE_SHUTDOWN:
-            message = await self.message_queue.get()
+            message = await self._next_message()
             if message.type == MESSAGE_START:
                 self.started()
             elif message.type == MESSAGE_STOP:
                 self.stopped()
             elif message.type == MESSAGE_EVT:
-                await self._propagate_message(message)
+                if not self._coalescer \
+                        or not self._coalescer.add(message, self.loop.time()):
+                    await self._propagate_message(message)
             elif message.type == MESSAGE_SHUTDOWN:
                 # do nothing, cycle will exit upon next iteration
                 pass
+            await self._flush_coalesced(message.type == MESSAGE_SHUTDOWN)
         await asyncio.sleep(SHUTDOWN_TIMEOUT, loop=self.loop)
 
+    async def _next_message(self):
+        """Next message from queue, MESSAGE_NONE when a flush is due"""
+
+        timeout = None
+        if self._coalescer:
+            timeout = self._coalescer.timeout(self.loop.time())
+        if timeout is None:
+            result = await self.message_queue.get()
+        else:
+            try:
+                result = await asyncio.wait_for(self.message_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                result = Message(MESSAGE_NONE, None, None)
+        return result
+
+    async def _flush_coalesced(self, force=False):
+        if self._coalescer:
+            if force or self._coalescer.timeout(self.loop.time()) == 0:
+                for message in self._coalescer.flush():
+                    await self._propagate_message(message)
+
     async def _propagate_message(self, evt):
-        for subsystem in self._subsystems.values():
+        for name in self._lazy_triggers.lookup(evt.value):
+            try:
+                self._cache.lookup('subsystem/{}'.format(name))
+            except Exception:
+                LOGGER.exception('Error activating subsystem %s', name)
+        for subsystem in self._router.lookup(evt.value):
             await subsystem.message_queue.put(evt)
 
+    def subscribe(self, subsystem, *events):
+        """Deliver events matching 'events' to 'subsystem'
+
+        Each entry is either an event name or a 'prefix_*' / '*_suffix'
+        pattern, a lone '*' matches every event.
+
+        """
+
+        for evt in events:
+            self._router.subscribe(evt, subsystem)
+
+    def unsubscribe(self, subsystem, *events):
+        """Stop delivering 'events' to 'subsystem', all events if none given"""
+
+        if events:
+            for evt in events:
+                self._router.unsubscribe(evt, subsystem)
+        else:
+            self._router.unsubscribe_all(subsystem)
+
     def on_start(self):
         self.emit('athome_starting')
 
     def after_started(self):
+        profiler.mark('athome_started')
         self.emit('athome_started')
 
     def on_stop(self):
@@ -119,13 +332,20 @@ class Core(SystemModule):
         self.message_queue.put_nowait(Message(MESSAGE_EVT, evt, data))
 
     @property
+    @volatile
     def subsystems(self):
-        return list(self._subsystems.keys())
+        return list(self._subsystems.keys())\
+            + [name for name in self._lazy if name not in self._subsystems]
 
     @property
     def status(self):
         return self.state
 
+    @property
+    @volatile
+    def startup_report(self):
+        return self._startup
+
 
     async def managed_stop(self):
         self.stop()
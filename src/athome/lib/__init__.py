@@ -5,12 +5,19 @@
 __all__ = [
     'locator', 
     'management', 
+    'metrics',
     'pluginrunner', 
     'atprotocol', 
     'executor', 
     'lineprotocol',
+    'coalescer',
+    'dependencies',
+    'feeds',
     'hbmqttrunner',
     'jobs',
     'procsubsystem',
+    'profiler',
+    'queues',
+    'routing',
     'taskrunner'
 ]
\ No newline at end of file
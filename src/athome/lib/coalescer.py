@@ -0,0 +1,82 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+import logging
+from collections import OrderedDict
+
+from athome import Message, MESSAGE_EVT
+from athome.lib.routing import EventRouter
+
+KEY_NAME = 'name'
+KEY_DATA = 'data'
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """Collapse bursts of events within a time window
+
+    Events whose name matches one of 'events' are held for at most 'window'
+    seconds, repeated events with the same key are merged into a single
+    message, carrying the latest data and the number of merged events in
+    'count'. With key 'name' all events with the same name are merged, with
+    key 'data' only events with the same name and equal (hashable) data.
+
+    """
+
+    def __init__(self, window, key=KEY_NAME, events=('*',)):
+        assert window > 0
+        if key not in (KEY_NAME, KEY_DATA):
+            raise ValueError('unknown coalesce key {}'.format(key))
+        self.window = window
+        self.key = key
+        self._router = EventRouter()
+        for pattern in events:
+            self._router.subscribe(pattern, self)
+        self._pending = OrderedDict()
+        self._deadline = None
+
+    def _key(self, msg):
+        result = msg.event
+        if self.key == KEY_DATA:
+            try:
+                hash(msg.data)
+                result = msg.event, msg.data
+            except TypeError:
+                result = None
+        return result
+
+    def add(self, msg, now):
+        """Hold 'msg' until the next flush, False if it can't be coalesced"""
+
+        key = None
+        if msg.type == MESSAGE_EVT and self._router.lookup(msg.value):
+            key = self._key(msg)
+        if key is not None:
+            pending = self._pending.get(key)
+            if pending:
+                self._pending[key] = Message(MESSAGE_EVT, msg.value, msg.data,
+                                             pending.count + msg.count)
+                self._pending.move_to_end(key)
+            else:
+                self._pending[key] = msg
+                if self._deadline is None:
+                    self._deadline = now + self.window
+        return key is not None
+
+    def timeout(self, now):
+        """Seconds until next flush is due, None if nothing is pending"""
+
+        result = None
+        if self._deadline is not None:
+            result = max(0, self._deadline - now)
+        return result
+
+    def flush(self):
+        """Return pending messages, in order of latest arrival"""
+
+        result = list(self._pending.values())
+        self._pending.clear()
+        self._deadline = None
+        return result
@@ -0,0 +1,62 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DependencyError(Exception):
+    pass
+
+
+def resolve_levels(dependencies):
+    """Sort a dependency graph in levels
+
+    'dependencies' maps each name to the names it depends on, every name in
+    a level depends only on names of previous levels. Names in the same
+    level are sorted, so the result is deterministic.
+
+    """
+
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    for name, deps in remaining.items():
+        unknown = deps - remaining.keys()
+        if unknown:
+            raise DependencyError('{} depends on unknown {}'.format(
+                name, ', '.join(sorted(unknown))))
+    result = []
+    while remaining:
+        level = sorted(name for name, deps in remaining.items() if not deps)
+        if not level:
+            raise DependencyError('dependency cycle among {}'.format(
+                ', '.join(sorted(remaining))))
+        for name in level:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(level)
+        result.append(level)
+    return result
+
+
+def split_eager(names, lazy, depends_of):
+    """Split 'names' into (eager, lazy) lists
+
+    Names in 'lazy' are lazy unless an eager name depends on them, directly
+    or through other dependencies, since an eager name can't wait for a
+    lazy one to be activated. 'depends_of(name)' returns the dependencies
+    of 'name', it is called once for every eager name.
+
+    """
+
+    eager = [name for name in names if name not in lazy]
+    lazy = [name for name in names if name in lazy]
+    pending = list(eager)
+    while pending:
+        for dep in depends_of(pending.pop(0)):
+            if dep in lazy:
+                lazy.remove(dep)
+                eager.append(dep)
+                pending.append(dep)
+    return eager, lazy
@@ -0,0 +1,90 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+import asyncio
+import logging
+
+from athome.lib.routing import EventRouter, WILDCARD
+
+DEFAULT_BUFFER = 100
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FeedClient:
+    """A feed subscriber, with topic filters and a bounded buffer"""
+
+    def __init__(self, topics, buffer):
+        self.router = EventRouter()
+        for topic in topics:
+            self.router.subscribe(topic, self)
+        self.queue = asyncio.Queue(maxsize=buffer)
+        self.closed = False
+
+    def accepts(self, name):
+        return bool(self.router.lookup(name))
+
+    def offer(self, item):
+        """Buffer 'item', False if the buffer is full"""
+
+        result = True
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            result = False
+        return result
+
+    def close(self):
+        """Discard buffered items and wake up the reader"""
+
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        """Next item, None once the client is closed"""
+
+        return await self.queue.get()
+
+
+class Feed:
+    """Fan out of named items to connected clients
+
+    Each client filters item names with its own topics, exact names or
+    'prefix*' / '*suffix' patterns, and buffers at most 'buffer' items.
+    A client whose buffer is full is disconnected rather than slowing
+    down the publisher.
+
+    """
+
+    def __init__(self, buffer=DEFAULT_BUFFER):
+        assert isinstance(buffer, int) and buffer > 0
+        self.buffer = buffer
+        self.clients = []
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.clients)
+
+    def connect(self, topics=(WILDCARD,)):
+        client = FeedClient(topics, self.buffer)
+        self.clients.append(client)
+        return client
+
+    def disconnect(self, client):
+        if client in self.clients:
+            self.clients.remove(client)
+            client.close()
+
+    def publish(self, name, item):
+        for client in tuple(self.clients):
+            if client.accepts(name) and not client.offer(item):
+                LOGGER.warning('dropping slow feed client')
+                self.dropped += 1
+                self.disconnect(client)
+
+    def close(self):
+        for client in tuple(self.clients):
+            self.disconnect(client)
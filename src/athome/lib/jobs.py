@@ -33,6 +33,7 @@ class Job:
                 self._cancelled_callback()
         else:
             if exc:
+                self.executor.failed += 1
                 self._traceback_stack = exc.__traceback__
                 self._handle_exception(exc)
                 if self._error_callback:
@@ -124,16 +125,22 @@ class Executor:
         self.exception_handler = exception_handler
         self._in_execution = set()
         self._failed_jobs = asyncio.Queue()
+        self.executed = 0
+        self.failed = 0
 
     def __contains__(self, item):
         return item in self._in_execution
 
+    def __len__(self):
+        return len(self._in_execution)
+
     def discard(self, task):
         self._in_execution.discard(task)
 
     def execute(self, coro, callback=None, error_callback=None, cancelled_callback=None):
         job = Job(coro, self, callback, error_callback, cancelled_callback)
         self._in_execution.add(job)
+        self.executed += 1
         return job
 
     def _handle_exception(self, ctx):
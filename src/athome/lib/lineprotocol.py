@@ -6,6 +6,8 @@ import asyncio
 import logging
 import json
 import collections
+import marshal
+import struct
 
 Line = collections.namedtuple('Line', ('req_id', 'message', 'payload'))
 
@@ -13,11 +15,23 @@ LINE_EXITED = 'exit'
 LINE_START = 'start'
 LINE_STARTED = 'started'
 LINE_ERROR = 'error'
+LINE_RESPONSE = 'response'
+LINE_LOG = 'log'
 
 TEXT_ENCODING = 'utf-8'
 
 NEW_LINE = 10
 
+FRAMING_JSON = 'json'
+FRAMING_MARSHAL = 'marshal'
+FRAMINGS = (FRAMING_MARSHAL, FRAMING_JSON)
+
+# A marshal frame is FRAME_MARKER, a big endian 32 bit length, then the
+# marshalled (req_id, message, payload) tuple. JSON lines never start
+# with FRAME_MARKER, so both framings can share a stream.
+FRAME_MARKER = 0
+FRAME_HEADER = struct.Struct('>BI')
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -31,11 +45,39 @@ def encode_line(line):
 
 
 def decode_line(text_line):
-    message = json.loads(text_line.decode(TEXT_ENCODING))
+    message = json.loads(str(text_line, TEXT_ENCODING))
     return Line(message['req_id'], message['message'], message['payload'])
 
 
+def encode_frame(line):
+    body = marshal.dumps(tuple(line))
+    return FRAME_HEADER.pack(FRAME_MARKER, len(body)) + body
+
+
+def decode_frame(body):
+    return Line(*marshal.loads(body))
+
+
+ENCODERS = {
+    FRAMING_JSON: encode_line,
+    FRAMING_MARSHAL: encode_frame
+}
+
+
+def choose_framing(offered):
+    """First framing of 'offered' this side supports, JSON if none"""
+
+    result = FRAMING_JSON
+    for framing in offered or ():
+        if framing in ENCODERS:
+            result = framing
+            break
+    return result
+
+
 class LineProtocol(asyncio.SubprocessProtocol):
+    """Receive newline terminated JSON lines and marshal frames"""
+
     def __init__(self, line_callback, exit_callback = None):
         self._buffer = bytearray()
         self._line_callback = line_callback
@@ -50,23 +92,38 @@ class LineProtocol(asyncio.SubprocessProtocol):
         return self.data_received(data)
 
     def _lines(self):
-        s_ind, e_ind = 0, -1 
-        while e_ind != 0:
-            e_ind = self._buffer.find(b'\n', s_ind) + 1
-            if e_ind:
-                line_bytes = self._buffer[s_ind:e_ind]
-                if len(line_bytes) > 1:
+        """Yield complete lines and frames, in any mix of framings"""
+
+        s_ind = 0
+        with memoryview(self._buffer) as view:
+            while s_ind < len(view):
+                if view[s_ind] == FRAME_MARKER:
+                    if len(view) - s_ind < FRAME_HEADER.size:
+                        break
+                    _, length = FRAME_HEADER.unpack_from(view, s_ind)
+                    e_ind = s_ind + FRAME_HEADER.size + length
+                    if e_ind > len(view):
+                        break
+                    line = decode_frame(view[s_ind + FRAME_HEADER.size:e_ind])
+                else:
+                    e_ind = self._buffer.find(b'\n', s_ind) + 1
+                    if not e_ind:
+                        break
                     # emtpy lines are not yielded
-                    yield decode_line(line_bytes)
+                    line = decode_line(view[s_ind:e_ind]) if e_ind - s_ind > 1 else None
                 s_ind = e_ind
+                if line is not None:
+                    yield line
         if s_ind > 0:
             del self._buffer[:s_ind]
-    
+
     def connection_lost(self, exc):
         self._line_callback(None)
 
     def pipe_connection_lost(self, fd, exc):
-        return self.connection_lost(exc)
+        # subprocess transports call connection_lost once every pipe is
+        # closed and the process exited
+        pass
 
     def process_exited(self):
         if self._exit_callback:
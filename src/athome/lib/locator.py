@@ -2,12 +2,24 @@
 #
 # See the file LICENCE for copying permission.
 
+import asyncio
+import inspect
 import re
 import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 4096
+
+WATCH_REGISTER = 'register'
+WATCH_UNREGISTER = 'unregister'
+WATCH_REPLACE = 'replace'
 
 LOGGER = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_path(path):
     normpath = re.sub(r'/+', '/', path)
     result = re.sub(r'(^/)|(/$)', '', normpath)
@@ -18,35 +30,173 @@ class NameError(Exception):
     pass
 
 
+class Lazy:
+    """Placeholder for an object created upon first lookup
+
+    When a Lazy entry is looked up 'factory' is called once and its
+    result replaces the placeholder.
+
+    """
+
+    def __init__(self, factory):
+        assert callable(factory)
+        self.factory = factory
+
+    def resolve(self):
+        return self.factory()
+
+
 class Cache:
+    """Hierarchical object registry, paths are '/' separated
+
+    Registered objects are kept both in a tree of dicts, which allows
+    looking up whole subtrees, and in a flat index keyed by normalized
+    path, so exact lookups of registered objects are a single dict hit.
+
+    Entries registered with a 'ttl' expire lazily, upon the first lookup
+    after their deadline. When 'lru_size' is set, at most 'lru_size'
+    factory created entries are kept, least recently used ones are
+    unregistered first.
+
+    Watchers are indexed by the path they watch, a change at path
+    'a/b/c' notifies the watchers of '', 'a', 'a/b' and 'a/b/c' only.
+    Every change also bumps 'version' and the version of its top level
+    node, in 'versions'.
+
+    """
 
     root = dict()
+    index = dict()
+    expiry = dict()
+    lru = OrderedDict()
+    watchers = dict()
+    inflight = dict()
+    version = 0
+    versions = dict()
     __instance = None
     __initialiazed = False
 
 
-    def __new__(cls, factory=None):
+    def __new__(cls, factory=None, lru_size=None):
         if cls.__instance is None:
             cls.__instance = object.__new__(cls)
         return cls.__instance
 
 
-    def __init__(self, factory=None):
+    def __init__(self, factory=None, lru_size=None):
         if not Cache.__initialiazed:
             self.factory = factory
+            self.lru_size = lru_size
             Cache.__initialiazed = True
 
 
     def lookup(self, path):
         assert path is not None
-        normalized_path, chunks = self._chop(path)
-        assert len(chunks) > 0, 'insufficient path length'
-        return self._lookup(self.root, chunks, normalized_path)
+        normalized_path = normalize_path(path)
+        if self.expiry and normalized_path in self.expiry:
+            self._check_expiry(normalized_path)
+        result = self.index.get(normalized_path)
+        if result is None or isinstance(result, Lazy):
+            normalized_path, chunks = self._chop(path)
+            assert len(chunks) > 0, 'insufficient path length'
+            result = self._lookup(self.root, chunks, normalized_path)
+        elif normalized_path in self.lru:
+            self.lru.move_to_end(normalized_path)
+        return result
+
+    def watch(self, prefix, callback):
+        """Invoke callback(event, path, obj) upon changes under 'prefix'
+
+        'event' is one of WATCH_REGISTER, WATCH_UNREGISTER, WATCH_REPLACE.
+
+        """
+
+        assert callable(callback)
+        self.watchers.setdefault(normalize_path(prefix), []).append(callback)
+
+    def unwatch(self, prefix, callback):
+        normalized_path = normalize_path(prefix)
+        callbacks = self.watchers.get(normalized_path)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del self.watchers[normalized_path]
+
+    def subtree_version(self, root):
+        """Number of changes under top level node 'root'"""
+
+        return self.versions.get(normalize_path(root), 0)
+
+    def _notify(self, event, original_path, obj):
+        Cache.version += 1
+        root = original_path.split('/', 1)[0]
+        self.versions[root] = self.versions.get(root, 0) + 1
+        if self.watchers:
+            chunks = original_path.split('/')
+            prefixes = [''] + ['/'.join(chunks[:i + 1]) for i in range(len(chunks))]
+            for prefix in prefixes:
+                for callback in tuple(self.watchers.get(prefix, ())):
+                    try:
+                        callback(event, original_path, obj)
+                    except Exception:
+                        LOGGER.exception('Error in watcher of %s', prefix)
+
+    async def async_lookup(self, path, factory=None, ttl=None):
+        """Lookup 'path', creating a missing object at most once
+
+        Missing objects are created by 'factory(path)', by default
+        self.factory.async_new or self.factory.new, which may return an
+        awaitable. Concurrent lookups of the same missing path share a
+        single creation, whose result is registered with 'ttl'.
+
+        This method is a *coroutine*.
+
+        """
+
+        assert path is not None
+        normalized_path = normalize_path(path)
+        if self.expiry and normalized_path in self.expiry:
+            self._check_expiry(normalized_path)
+        if normalized_path in self.index:
+            result = self.lookup(normalized_path)
+        else:
+            future = self.inflight.get(normalized_path)
+            if future is None:
+                future = asyncio.ensure_future(
+                    self._create(normalized_path, factory, ttl))
+                self.inflight[normalized_path] = future
+                future.add_done_callback(
+                    lambda f: self.inflight.pop(normalized_path, None))
+            result = await asyncio.shield(future)
+        return result
+
+    async def _create(self, normalized_path, factory, ttl):
+        if factory is None:
+            if not self.factory:
+                raise NameError(
+                    'Can\'t find object at path {}'.format(normalized_path))
+            factory = getattr(self.factory, 'async_new', self.factory.new)
+        result = factory(normalized_path)
+        if inspect.isawaitable(result):
+            result = await result
+        self.replace(normalized_path, result, ttl)
+        self._track(normalized_path)
+        return result
+
+    def _check_expiry(self, normalized_path):
+        if self.expiry[normalized_path] <= time.monotonic():
+            LOGGER.debug('entry %s expired', normalized_path)
+            self.unregister(normalized_path)
 
 
     def _lookup(self, node, chunks, original_path):
         first, remaining = chunks[0], chunks[1:]
         current_node = node.get(first)
+        if isinstance(current_node, Lazy):
+            current_node = node[first] = current_node.resolve()
+            if not remaining:
+                self.index[original_path] = current_node
+                self._notify(WATCH_REPLACE, original_path, current_node)
         if not remaining:
             if current_node:
                 result = current_node
@@ -54,6 +204,7 @@ class Cache:
                 if self.factory:
                     result = self.factory.new(original_path)
                     self.register(original_path, result)
+                    self._track(original_path)
                 else:
                     raise NameError(
                         'Can\'t find object at path {}'.format(original_path))
@@ -65,15 +216,133 @@ class Cache:
         return result
 
 
+    def walk(self, prefix=''):
+        """Yield (path, obj) for every object under 'prefix'
+
+        Paths are yielded depth first, in name order, one tree level is
+        materialized at a time. Lazy placeholders are yielded unresolved.
+
+        """
+
+        for path, obj in self._walk(prefix, None):
+            yield path, obj
+
+    def list(self, prefix='', depth=None):
+        """Paths of the objects under 'prefix'
+
+        With 'depth' only paths up to 'depth' levels below 'prefix' are
+        listed, deeper subtrees are listed by their root path.
+
+        """
+
+        assert depth is None or depth > 0
+        return [path for path, _ in self._walk(prefix, depth)]
+
+    def _walk(self, prefix, depth):
+        normalized_path = normalize_path(prefix)
+        node = self._node(normalized_path)
+        if not isinstance(node, dict):
+            yield normalized_path, node
+            return
+        stack = [(normalized_path, iter(sorted(node.items())), 1)]
+        while stack:
+            base, items, level = stack[-1]
+            for name, child in items:
+                path = '{}/{}'.format(base, name) if base else name
+                if path in self.expiry and self.expiry[path] <= time.monotonic():
+                    continue
+                if isinstance(child, dict) and (depth is None or level < depth):
+                    stack.append((path, iter(sorted(child.items())), level + 1))
+                    break
+                yield path, child
+            else:
+                stack.pop()
+
+    def _node(self, normalized_path):
+        """Return tree node at 'normalized_path' without creating it"""
+
+        result = self.root
+        if normalized_path:
+            for chunk in normalized_path.split('/'):
+                result = result.get(chunk) if isinstance(result, dict) else None
+                if result is None:
+                    raise NameError(
+                        'Can\'t find object at path {}'.format(normalized_path))
+        return result
+
     @staticmethod
     def _chop(path):
         normalized_path = normalize_path(path)
         return normalized_path, normalized_path.split('/')
 
 
-    def register(self, path, obj):
+    def register(self, path, obj, ttl=None):
         original_path, chunks,  = self._chop(path)
         self._append(self.root, chunks, obj, original_path)
+        self.index[original_path] = obj
+        if ttl is not None:
+            self.expiry[original_path] = time.monotonic() + ttl
+        self._notify(WATCH_REGISTER, original_path, obj)
+
+
+    def replace(self, path, obj, ttl=None):
+        """Register 'obj' at 'path' in place of the current one, if any
+
+        Returns the replaced object or None.
+
+        """
+
+        original_path, chunks = self._chop(path)
+        result = self.index.get(original_path)
+        if result is None:
+            self.register(original_path, obj, ttl)
+        else:
+            node = self._node('/'.join(chunks[:-1]))
+            node[chunks[-1]] = obj
+            self.index[original_path] = obj
+            self.lru.pop(original_path, None)
+            if ttl is not None:
+                self.expiry[original_path] = time.monotonic() + ttl
+            else:
+                self.expiry.pop(original_path, None)
+            self._notify(WATCH_REPLACE, original_path, obj)
+        return result
+
+
+    def unregister(self, path):
+        """Remove and return object at 'path', empty parents are pruned"""
+
+        original_path, chunks = self._chop(path)
+        if original_path not in self.index:
+            raise NameError(
+                'Can\'t find object at path {}'.format(original_path))
+        result = self.index.pop(original_path)
+        self.expiry.pop(original_path, None)
+        self.lru.pop(original_path, None)
+        self._remove(self.root, chunks)
+        self._notify(WATCH_UNREGISTER, original_path, result)
+        return result
+
+
+    def _remove(self, node, chunks):
+        first, remaining = chunks[0], chunks[1:]
+        if remaining:
+            self._remove(node[first], remaining)
+            if not node[first]:
+                del node[first]
+        else:
+            del node[first]
+
+
+    def _track(self, original_path):
+        """Track a factory created entry, evicting the least recently used"""
+
+        if self.lru_size:
+            self.lru[original_path] = True
+            while len(self.lru) > self.lru_size:
+                evicted, _ = self.lru.popitem(last=False)
+                LOGGER.debug('evicting %s', evicted)
+                self.unregister(evicted)
 
 
     def _append(self, node, chunks, obj, original_path):
@@ -9,61 +9,126 @@ import functools
 import json
 
 from collections import namedtuple
-MethodInfo = namedtuple('MethodInfo', ('orig_name', 'params'))
+MethodInfo = namedtuple('MethodInfo', ('orig_name', 'params', 'cache_ttl'))
+ClassInfo = namedtuple('ClassInfo', ('name', 'read_properties', 'write_properties',
+                                     'volatile_properties', 'methods', 'meta'))
 
 LOGGER = logging.getLogger(__name__)
 
-def managed(name=None):
+_class_info = dict()
+
+
+def managed(name=None, cache_ttl=None):
+    """Expose a coroutine method, results of calls without arguments may be
+    cached for 'cache_ttl' seconds"""
 
     def wrap_coro(decorated_coro):
         assert asyncio.iscoroutinefunction(decorated_coro)
-        decorated_coro._managed_method = name or func.__name__
+        decorated_coro.managed = name or decorated_coro.__name__
+        if cache_ttl is not None:
+            decorated_coro.cache_ttl = cache_ttl
         return decorated_coro
 
     return wrap_coro
 
 
+def volatile(getter):
+    """Mark a property getter whose value changes without a version bump
+
+    Volatile properties are read on every snapshot instead of being cached
+    with the object version.
+
+    """
+
+    getter.volatile = True
+    return getter
+
+
+def class_info(cls):
+    """Return the ClassInfo of 'cls', introspected once per class"""
+
+    result = _class_info.get(cls)
+    if result is None:
+        result = _class_info[cls] = _inspect_class(cls)
+    return result
+
+
+def _inspect_class(cls):
+    read_properties = set()
+    write_properties = set()
+    volatile_properties = set()
+    methods = dict()
+    props = inspect.getmembers(cls, lambda m: isinstance(m, property))
+    for name, prop in props:
+        if prop.fget:
+            read_properties.add(name)
+            if getattr(prop.fget, 'volatile', False):
+                volatile_properties.add(name)
+        if prop.fset:
+            write_properties.add(name)
+
+    meths = inspect.getmembers(cls, asyncio.iscoroutinefunction)
+    for name, meth in meths:
+        LOGGER.debug('analyze method: %s', name)
+        managed_name = getattr(meth, 'managed', None)
+        if managed_name:
+            spec = inspect.getfullargspec(meth)
+            assert not spec.varargs, 'varargs not allowed in managed methods'
+            assert not spec.varkw, 'varkw not allowed in managed methods'
+            assert not spec.kwonlyargs, 'kwonlyargs not allowed in managed methods'
+            cache_ttl = getattr(meth, 'cache_ttl', None)
+            methods[managed_name] = MethodInfo(name, spec.args[1:], cache_ttl)
+    meta = dict()
+    meta['class'] = cls.__name__
+    meta['read_properties'] = sorted(read_properties)
+    meta['write_properties'] = sorted(write_properties)
+    meta['methods'] = {name: method.params for name, method in methods.items()}
+    return ClassInfo(cls.__name__, frozenset(read_properties),
+                     frozenset(write_properties), frozenset(volatile_properties),
+                     methods, json.dumps(meta))
+
+
 class ManagedObject:
+    """Per instance view over the ClassInfo of the managed object
+
+    Objects exposing a 'version' counter, bumped whenever their state
+    changes, get their JSON snapshot cached: only volatile properties are
+    serialized again until the version moves.
+
+    """
 
     def __init__(self, obj):
         self.obj = obj
         self._managed_class = obj.__class__
-        self._read_properties = set()
-        self._write_properties = set()
-        self.methods = dict()
-        props = inspect.getmembers(self._managed_class, lambda m: isinstance(m, property))
-        for name, prop in props:
-            if prop.fget:
-                self._read_properties.add(name)
-            if prop.fset:
-                self._write_properties.add(name)
-        
-        meths = inspect.getmembers(self.obj, asyncio.iscoroutinefunction)
-        for name, meth in meths:
-            LOGGER.debug('analyze method: %s', name)
-            managed_name = getattr(meth, 'managed', None)
-            if managed_name:
-                spec = inspect.getfullargspec(meth)
-                assert not spec.varargs, 'varargs not allowed in managed methods'
-                assert not spec.varkw, 'varkw not allowed in managed methods'
-                assert not spec.kwonlyargs, 'kwonlyargs not allowed in managed methods'
-                self.methods[managed_name] = MethodInfo(name, spec.args[1:])
+        self.info = class_info(self._managed_class)
+        self.methods = self.info.methods
+        self._stable = sorted(self.info.read_properties - self.info.volatile_properties)
+        self._volatile = sorted(self.info.volatile_properties)
+        self._snapshot = None
+        self._snapshot_bytes = None
+        self._snapshot_version = None
 
     @property
     def read_properties(self):
-        return self._read_properties
+        return self.info.read_properties
 
     @property
     def write_properties(self):
-        return self._write_properties
+        return self.info.write_properties
+
+    @property
+    def version(self):
+        return getattr(self.obj, 'version', None)
 
     def get_property(self, prop):
-        assert prop in self._read_properties
+        assert prop in self.info.read_properties
         return getattr(self.obj, prop)
 
     def set_property(self, prop, value):
-        assert prop in self._write_properties
+        assert prop in self.info.write_properties
         setattr(self.obj, prop, value)
+        if self.version is not None:
+            self.obj.version += 1
 
     def invoke(self, method, args=list()):
         assert method in self.methods
@@ -73,15 +138,41 @@ class ManagedObject:
         assert method in self.methods
         return await getattr(self.obj, self.methods[method].orig_name)(*args)
 
+    def _serialize(self, props):
+        """JSON object members of 'props', without the enclosing braces"""
+
+        return json.dumps({prop: self.get_property(prop) for prop in props})[1:-1]
+
+    def volatile_members(self):
+        """JSON object members of the volatile properties, read afresh"""
+
+        result = ''
+        if self._volatile:
+            result = self._serialize(self._volatile)
+        return result
+
+    def snapshot(self, volatile=None):
+        """Return the object JSON representation, as bytes
+
+        'volatile' are members previously read with volatile_members(),
+        by default they are read afresh.
+
+        """
+
+        version = self.version
+        if version is None or version != self._snapshot_version:
+            members = ['"__meta": ' + self.info.meta]
+            if self._stable:
+                members.append(self._serialize(self._stable))
+            self._snapshot = ', '.join(members)
+            self._snapshot_bytes = ('{' + self._snapshot + '}').encode('utf-8')
+            self._snapshot_version = version
+        if volatile is None:
+            volatile = self.volatile_members()
+        result = self._snapshot_bytes
+        if volatile:
+            result = ('{' + self._snapshot + ', ' + volatile + '}').encode('utf-8')
+        return result
+
     def json(self):
-        result = dict()
-        meta = dict()
-        meta['class'] = self._managed_class.__name__
-        meta['read_properties'] = list(self._read_properties)
-        meta['write_properties'] = list(self._write_properties)
-        meta['methods'] = {name: method.params for name, method in self.methods.items()}
-
-        result['__meta'] = meta
-        for prop in self._read_properties:
-            result[prop] = self.get_property(prop)
-        return json.dumps(result)
+        return self.snapshot().decode('utf-8')
@@ -0,0 +1,77 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""Minimal metrics in the Prometheus text exposition format"""
+
+import bisect
+import logging
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Cumulative histogram of observed values"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yield (upper bound, count of values <= bound), '+Inf' last"""
+
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield repr(bound), total
+        yield '+Inf', self.count
+
+
+def format_labels(labels):
+    result = ''
+    if labels:
+        pairs = []
+        for name, value in sorted(labels.items()):
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append('{}="{}"'.format(name, value))
+        result = '{' + ','.join(pairs) + '}'
+    return result
+
+
+class Exposition:
+    """Builder of a text exposition, one family at a time"""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_):
+        self.lines.append('# HELP {} {}'.format(name, help_))
+        self.lines.append('# TYPE {} {}'.format(name, kind))
+
+    def sample(self, name, value, labels=None):
+        self.lines.append('{}{} {}'.format(name, format_labels(labels), value))
+
+    def histogram(self, name, histogram, labels=None):
+        labels = labels or dict()
+        for bound, count in histogram.cumulative():
+            self.sample(name + '_bucket', count, dict(labels, le=bound))
+        self.sample(name + '_sum', histogram.sum, labels)
+        self.sample(name + '_count', histogram.count, labels)
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
@@ -4,61 +4,56 @@
 
 import sys
 import asyncio
-import contextlib
+import itertools
 import logging
-import json
 
 from athome.subsystem import SubsystemModule
+from athome.lib.lineprotocol import LINE_START, LINE_STARTED, LINE_RESPONSE,\
+    LINE_LOG, ENCODERS, FRAMING_JSON, FRAMINGS, Line, LineProtocol,\
+    choose_framing
 
-LINE_EXITED = 'exit\n'
-LINE_STARTED = 'started\n'
-
-COMMAND_START = 'start'
+DEFAULT_REQUEST_TIMEOUT = 10
 
 LOGGER = logging.getLogger(__name__)
 
 
-def format_request(self, command, arg):
-    message_arg = json.dumps(arg)
-    return '{} {}'.format(COMMAND_START, json.dumps(message_config))
-
-
-def send_line(self, stream, payload):
-    stream.write((payload + '\n').encode('utf-8'))
-
-
-@staticmethod
-def parse_line(line):
-    command, arg, chunks = line[:-1], None, line[:-1].split(' ', 1)
-    if len(chunks) > 1:
-        command, args = chunks[0], chunks[1]
-        arg = json.loads(args)
-    return command, arg
+class RequestError(Exception):
+    """A request failed in the subprocess, 'traceback' is the remote one"""
 
+    def __init__(self, message, traceback=None):
+        super().__init__(message)
+        self.traceback = traceback
 
-class PipeRequest:
-    def __init__(self, command, arg, input_stream, output_stream):
-        self.command = command
-        self.arg = arg
-        self.input_stream = input_stream
-        self.output_stream = output_stream
 
-    @property   
-    async def response(self):
-        send_line(self.output_stream, self.command, json.dumps(self.arg))
-        line = await input_stream.readline()
+class ProcSubsystem(SubsystemModule):
+    """Subprocess subsystem
 
+    Requests to the subprocess are multiplexed on its stdin, each one
+    carries a 'req_id' and the reader dispatches 'response' lines to the
+    pending request with the same id, so many requests can be in flight.
 
+    The framings listed in the 'framing' configuration value, by default
+    marshal frames then newline JSON, are offered with 'start'; both
+    sides switch to the one the runner picks in its 'started' reply.
 
-class ProcSubsystem(SubsystemModule):
-    """Subprocess subsystem"""
+    """
 
     def __init__(self, name, module, params=list()):
         super().__init__(name)
         assert isinstance(params, (list, tuple))
-        self.proc = None
+        self.transport = None
         self.module = module
         self.params = params
+        self._req_ids = itertools.count(1)
+        self._pending = dict()
+        self._closed = None
+        self.framing = FRAMING_JSON
+        self._started_event = '{}_started'.format(name)
+        self._stopped_event = '{}_stopped'.format(name)
+
+    @property
+    def request_timeout(self):
+        return (self.config or {}).get('request_timeout', DEFAULT_REQUEST_TIMEOUT)
 
     def on_start(self):
         self.executor.execute(self.run())
@@ -66,66 +61,115 @@ class ProcSubsystem(SubsystemModule):
     def on_stop(self):
         """On 'stop' event callback method"""
 
-        if self.proc:
-            self.proc.terminate()
+        if self.transport:
+            self.transport.terminate()
 
     def on_shutdown(self):
         """On 'shutdown' event callback method"""
-        if self.proc:
-            self.proc.kill()
+
+        if self.transport:
+            self.transport.kill()
 
     async def run(self):
         """Subsystem activity method
 
         This method is a *coroutine*.
         """
+
+        params = [sys.executable, '-m', self.module] + list(self.params)
+        self._closed = self.loop.create_future()
+        self.framing = FRAMING_JSON
         try:
-            params = [sys.executable, '-m', self.module] + self.params
-            with contextlib.suppress(asyncio.CancelledError):
-                self.proc = await asyncio.create_subprocess_exec(*params, 
-                    stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
-                    loop=self.loop)
-
-                # initialize subprocess runner
-                message_config = {
-                    'env': self.,
-                    'subsystem_config': self.config
-                }
-                await self.line_execute(COMMAND_START, message_config)
-
-                while True:
-                    data = await self.proc.stdout.readline()
-                    if not data:
-                        # EOF reached, pipe closed
-                        break
-    
-                    data = data.decode('utf-8')
-                    if data == LINE_STARTED:
-                        self.started()
-            if self.proc.returncode is None:
-                self.proc.kill()
-            self.proc = None
-            if not self.state in 'closed', 'failed':
-                self.stopped()
-        except Exception as ex:
+            self.transport, _ = await self.loop.subprocess_exec(
+                lambda: LineProtocol(self.line_received), *params,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=None)
+            self.send_line(LINE_START, {
+                'env': self.env,
+                'subsystem_config': self.config,
+                'framing': list(self.config.get('framing', FRAMINGS))
+            })
+            await self._closed
+        except Exception:
             LOGGER.exception('Exception occurred in run() coro')
-            if self.proc:
-                LOGGER.warning('Forcibly terminate process %s', self.proc)
-                self.proc.kill()
-            raise ex
-    
-    async def line_execute(self, command, arg=None):
-        request = PipeRequest(command, arg, self.proc, self.proc)
-        return await request.response
-
-    async def handle_log(self, value):
-        pass
+            if self.transport and self.transport.get_returncode() is None:
+                LOGGER.warning('Forcibly terminate process %s', self.module)
+                self.transport.kill()
+            raise
+        finally:
+            self._abort_pending(ConnectionError('{} exited'.format(self.module)))
+            if self.transport:
+                self.transport.close()
+            self.transport = None
+            if self.is_stopping():
+                self.stopped()
+            elif self.is_starting() or self.is_running():
+                self.fail()
+
+    def send_line(self, message, payload=None, req_id=None):
+        if not self.transport:
+            raise ConnectionError('{} is not running'.format(self.module))
+        encoder = ENCODERS[self.framing]
+        self.transport.get_pipe_transport(0).write(encoder(Line(req_id, message, payload)))
+
+    def line_received(self, line):
+        """Dispatch a line from the subprocess, None once it is gone"""
+
+        if line is None:
+            if not self._closed.done():
+                self._closed.set_result(None)
+        elif line.message == LINE_RESPONSE:
+            self._resolve(line)
+        elif line.message == LINE_STARTED:
+            self.framing = choose_framing([(line.payload or {}).get('framing')])
+            if self.is_starting():
+                self.started()
+        elif line.message == LINE_LOG:
+            self.handle_log(line.payload)
+        else:
+            LOGGER.warning('unexpected line %s from %s', line.message, self.module)
+
+    def _resolve(self, line):
+        future = self._pending.get(line.req_id)
+        if future is None or future.done():
+            LOGGER.debug('late response %s from %s', line.req_id, self.module)
+        elif line.payload.get('error') is not None:
+            message = line.payload.get('error_message') or line.payload['error']
+            future.set_exception(RequestError(message, line.payload.get('error_tb')))
+        else:
+            future.set_result(line.payload.get('response'))
+
+    def _abort_pending(self, exc):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
+
+    async def line_execute(self, command, arg=None, timeout=None):
+        """Send request 'command' and wait for its response
+
+        Raises RequestError if the request failed in the subprocess and
+        asyncio.TimeoutError after 'timeout' seconds, by default the
+        'request_timeout' configuration value.
 
-    def after_started(self):
-        self.emit('{}_started'.format(self.name))
+        This method is a *coroutine*.
+        """
 
-    def after_stopped(self):
-        self.emit('{}_stopped'.format(self.name))
+        req_id = next(self._req_ids)
+        future = self.loop.create_future()
+        self._pending[req_id] = future
+        try:
+            self.send_line(command, arg, req_id)
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        finally:
+            self._pending.pop(req_id, None)
 
+    def handle_log(self, record):
+        logger = logging.getLogger('{}.{}'.format(self.name, record['name']))
+        logger.log(record['level'], '%s', record['message'])
 
+    def after_started(self):
+        self.emit(self._started_event)
 
+    def after_stopped(self):
+        self.emit(self._stopped_event)
@@ -0,0 +1,157 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+import contextlib
+import json
+import logging
+import os
+import time
+
+REPORT_NAME = 'startup-profile'
+BAR_WIDTH = 50
+
+LOGGER = logging.getLogger(__name__)
+
+_current = None
+
+
+class StartupProfiler:
+    """Record monotonic timestamps of startup phases and state transitions
+
+    All times are in seconds since the profiler was created.
+
+    """
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.phases = []
+        self.transitions = []
+
+    def _now(self):
+        return time.monotonic() - self.origin
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        entry = {'name': name, 'begin': self._now(), 'end': None}
+        self.phases.append(entry)
+        try:
+            yield entry
+        finally:
+            entry['end'] = self._now()
+
+    def mark(self, name):
+        now = self._now()
+        self.phases.append({'name': name, 'begin': now, 'end': now})
+
+    def state_changed(self, module, state):
+        self.transitions.append({
+            'module': module.name,
+            'state': state,
+            'at': self._now()
+        })
+
+    def spans(self):
+        """Phases followed by one span per module state, in start order"""
+
+        result = [(phase['name'], phase['begin'], phase['end'])
+                  for phase in self.phases]
+        last = dict()
+        for transition in self.transitions:
+            previous = last.get(transition['module'])
+            if previous:
+                result.append(('{}:{}'.format(previous['module'], previous['state']),
+                               previous['at'], transition['at']))
+            last[transition['module']] = transition
+        for transition in last.values():
+            result.append(('{}:{}'.format(transition['module'], transition['state']),
+                           transition['at'], transition['at']))
+        result.sort(key=lambda span: span[1])
+        return result
+
+    def report(self):
+        return {
+            'total': self._now(),
+            'phases': self.phases,
+            'transitions': self.transitions
+        }
+
+    def waterfall(self):
+        spans = self.spans()
+        total = max([span[2] or 0 for span in spans] + [self._now()])
+        scale = BAR_WIDTH / total if total else 0
+        name_width = max([len(span[0]) for span in spans] + [4])
+        lines = ['startup profile, {:.3f}s total'.format(total)]
+        for name, begin, end in spans:
+            end = begin if end is None else end
+            offset = int(begin * scale)
+            width = max(1, int((end - begin) * scale))
+            bar = (' ' * offset + '#' * width)[:BAR_WIDTH]
+            lines.append('{:<{}} {:8.3f} {:8.3f} |{:<{}}|'.format(
+                name, name_width, begin, end - begin, bar, BAR_WIDTH))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory):
+        """Write JSON and waterfall reports into 'directory'"""
+
+        json_path = os.path.join(directory, REPORT_NAME + '.json')
+        text_path = os.path.join(directory, REPORT_NAME + '.txt')
+        with open(json_path, 'w') as json_file:
+            json.dump(self.report(), json_file, indent=2)
+        with open(text_path, 'w') as text_file:
+            text_file.write(self.waterfall())
+        LOGGER.info('startup profile written to %s', text_path)
+        return json_path, text_path
+
+
+def enable():
+    """Create the process wide profiler"""
+
+    global _current
+    _current = StartupProfiler()
+    return _current
+
+
+def disable():
+    global _current
+    _current = None
+
+
+def current():
+    return _current
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time 'name' on the current profiler, if any"""
+
+    if _current:
+        with _current.phase(name) as entry:
+            yield entry
+    else:
+        yield None
+
+
+def mark(name):
+    if _current:
+        _current.mark(name)
+
+
+def state_changed(module, state):
+    """State listener recording transitions on the current profiler, if any"""
+
+    if _current:
+        _current.state_changed(module, state)
+
+
+def write_report(directory):
+    """Write the current profile into 'directory' and disable profiling
+
+    Returns the paths written, None if profiling is not enabled.
+    """
+
+    result = None
+    if _current:
+        result = _current.write(directory)
+        disable()
+    return result
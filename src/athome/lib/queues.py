@@ -0,0 +1,114 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+import asyncio
+import logging
+
+from athome import MESSAGE_EVT
+
+POLICY_BLOCK = 'block'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_DROP_NEWEST = 'drop_newest'
+POLICY_COALESCE = 'coalesce'
+
+POLICIES = (
+    POLICY_BLOCK,
+    POLICY_DROP_OLDEST,
+    POLICY_DROP_NEWEST,
+    POLICY_COALESCE
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MessageQueue(asyncio.Queue):
+    """Message queue with an optional bound and overflow policy
+
+    The bound only applies to MESSAGE_EVT messages, control messages
+    (start, stop, shutdown) are always enqueued. When the bound is reached
+    an incoming event is handled according to 'policy':
+
+    block:       put() waits for room, put_nowait() raises QueueFull
+    drop_oldest: the oldest queued event is discarded
+    drop_newest: the incoming event is discarded
+    coalesce:    a queued event with the same name is discarded and the
+                 incoming one queued last, if there is none the oldest
+                 queued event is discarded
+
+    """
+
+    def __init__(self, maxsize=0, policy=POLICY_BLOCK):
+        super().__init__()
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self._room = asyncio.Event()
+        self.configure(maxsize, policy)
+
+    def configure(self, maxsize=0, policy=POLICY_BLOCK):
+        if policy not in POLICIES:
+            raise ValueError('unknown queue policy {}'.format(policy))
+        assert isinstance(maxsize, int) and maxsize >= 0
+        self.bound = maxsize
+        self.policy = policy
+
+    def _overflows(self, item):
+        return self.bound\
+            and item.type == MESSAGE_EVT\
+            and len(self._queue) >= self.bound
+
+    async def put(self, item):
+        while self.policy == POLICY_BLOCK and self._overflows(item):
+            self.blocked += 1
+            self._room.clear()
+            await self._room.wait()
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        if self.policy == POLICY_BLOCK and self._overflows(item):
+            raise asyncio.QueueFull()
+        super().put_nowait(item)
+
+    def _put(self, item):
+        if self._overflows(item):
+            if self.policy == POLICY_DROP_NEWEST:
+                self.dropped += 1
+                return
+            if self.policy == POLICY_COALESCE and self._coalesce(item):
+                self.coalesced += 1
+                return
+            self._drop_oldest()
+        self._queue.append(item)
+
+    def _get(self):
+        result = super()._get()
+        self._room.set()
+        return result
+
+    def _coalesce(self, item):
+        result = False
+        for index, queued in enumerate(self._queue):
+            if queued.type == MESSAGE_EVT and queued.event == item.event:
+                del self._queue[index]
+                self._queue.append(item)
+                result = True
+                break
+        return result
+
+    def _drop_oldest(self):
+        for index, queued in enumerate(self._queue):
+            if queued.type == MESSAGE_EVT:
+                del self._queue[index]
+                self.dropped += 1
+                break
+
+    def stats(self):
+        return {
+            'size': self.qsize(),
+            'maxsize': self.bound,
+            'policy': self.policy,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'blocked': self.blocked
+        }
@@ -0,0 +1,157 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+import logging
+
+WILDCARD = '*'
+
+MEMO_SIZE = 4096
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _TrieNode:
+
+    __slots__ = ('children', 'subscribers')
+
+    def __init__(self):
+        self.children = dict()
+        self.subscribers = []
+
+
+class _Trie:
+    """Character trie, subscribers are stored at the end of their key"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def add(self, key, subscriber):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        if subscriber not in node.subscribers:
+            node.subscribers.append(subscriber)
+
+    def remove(self, key, subscriber):
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return
+        if subscriber in node.subscribers:
+            node.subscribers.remove(subscriber)
+
+    def remove_all(self, subscriber):
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            if subscriber in node.subscribers:
+                node.subscribers.remove(subscriber)
+            nodes.extend(node.children.values())
+
+    def matches(self, key):
+        """Yield subscribers of every key which is a prefix of 'key'"""
+
+        node = self.root
+        yield from node.subscribers
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                break
+            yield from node.subscribers
+
+
+def parse_pattern(pattern):
+    """Split 'pattern' into (kind, key)
+
+    'kind' is one of 'exact', 'prefix' or 'suffix', a lone '*' is a prefix
+    pattern with an empty key and matches every event.
+
+    """
+
+    assert pattern and isinstance(pattern, str)
+    if WILDCARD not in pattern:
+        result = 'exact', pattern
+    elif pattern.count(WILDCARD) == 1 and pattern.endswith(WILDCARD):
+        result = 'prefix', pattern[:-1]
+    elif pattern.count(WILDCARD) == 1 and pattern.startswith(WILDCARD):
+        result = 'suffix', pattern[:0:-1]
+    else:
+        raise ValueError('unsupported event pattern {}'.format(pattern))
+    return result
+
+
+class EventRouter:
+    """Index of event subscribers, keyed by event name or pattern
+
+    Besides exact names subscribers may use 'prefix_*' and '*_suffix'
+    patterns, which are kept in two tries (suffixes reversed) so matching
+    an event costs O(len(name)) whatever the number of patterns.
+    Subscribers are returned in subscription order, exact ones first.
+    Lookup results are memoized until subscriptions change, the memo is
+    emptied when it holds 'memo_size' names, so unbounded event names
+    don't grow it forever.
+
+    """
+
+    def __init__(self, memo_size=MEMO_SIZE):
+        assert memo_size > 0
+        self._exact = dict()
+        self._prefixes = _Trie()
+        self._suffixes = _Trie()
+        self._memo = dict()
+        self._memo_size = memo_size
+
+    def subscribe(self, pattern, subscriber):
+        kind, key = parse_pattern(pattern)
+        self._memo.clear()
+        if kind == 'exact':
+            subscribers = self._exact.setdefault(key, [])
+            if subscriber not in subscribers:
+                subscribers.append(subscriber)
+        elif kind == 'prefix':
+            self._prefixes.add(key, subscriber)
+        else:
+            self._suffixes.add(key, subscriber)
+
+    def unsubscribe(self, pattern, subscriber):
+        kind, key = parse_pattern(pattern)
+        self._memo.clear()
+        if kind == 'exact':
+            subscribers = self._exact.get(key)
+            if subscribers and subscriber in subscribers:
+                subscribers.remove(subscriber)
+                if not subscribers:
+                    del self._exact[key]
+        elif kind == 'prefix':
+            self._prefixes.remove(key, subscriber)
+        else:
+            self._suffixes.remove(key, subscriber)
+
+    def unsubscribe_all(self, subscriber):
+        for name in list(self._exact.keys()):
+            self.unsubscribe(name, subscriber)
+        self._prefixes.remove_all(subscriber)
+        self._suffixes.remove_all(subscriber)
+        self._memo.clear()
+
+    def lookup(self, name):
+        """Return subscribers of event 'name', as a tuple"""
+
+        result = self._memo.get(name)
+        if result is None:
+            if len(self._memo) >= self._memo_size:
+                self._memo.clear()
+            result = self._memo[name] = self._match(name)
+        return result
+
+    def _match(self, name):
+        result = list(self._exact.get(name, ()))
+        for subscriber in self._prefixes.matches(name):
+            if subscriber not in result:
+                result.append(subscriber)
+        for subscriber in self._suffixes.matches(name[::-1]):
+            if subscriber not in result:
+                result.append(subscriber)
+        return tuple(result)
@@ -8,26 +8,35 @@ import logging
 import os
 import signal
 import sys
+import traceback
 from functools import partial
 
 import athome
 from athome import MESSAGE_LINE, MESSAGE_SHUTDOWN, Message
 from athome.lib.jobs import Executor
-from athome.lib.lineprotocol import (LINE_START, LINE_STARTED,
-                                     Line, LineProtocol, decode_line,
-                                     encode_line)
+from athome.lib.lineprotocol import (LINE_ERROR, LINE_LOG, LINE_RESPONSE,
+                                     LINE_START, LINE_STARTED, ENCODERS,
+                                     FRAMING_JSON, Line, LineProtocol,
+                                     choose_framing, decode_line)
 
 LOGGER = logging.getLogger(__name__)
 
 
 class LineLoggingHandler(logging.Handler):
+    """Forward log records to the parent process as 'log' lines"""
 
-    def __init__(self, stream):
+    def __init__(self, runner):
         super().__init__()
-        self._stream = stream
-    
+        self._runner = runner
+        self.setFormatter(logging.Formatter('%(message)s'))
+
     def emit(self, record):
-         self._stream.write(encode_line(Line(None, 'log', record))
+        if self._runner.pipe_stream:
+            self._runner.sendline(LINE_LOG, {
+                'name': record.name,
+                'level': record.levelno,
+                'message': self.format(record)
+            })
 
 
 class RunnerSupport:
@@ -42,6 +51,7 @@ class RunnerSupport:
         self.env = None
         self.config = None
         self.executor = Executor(loop=self.loop)
+        self.framing = FRAMING_JSON
         self.running = False
         for signame in 'SIGINT', 'SIGTERM':
             self.loop.add_signal_handler(
@@ -53,7 +63,7 @@ class RunnerSupport:
         self.messages.put_nowait(Message(MESSAGE_LINE, line, None))
 
     def sendline(self, message, payload=None, req_id=None):
-        self.pipe_stream.write(encode_line(Line(req_id, message, payload)))
+        self.pipe_stream.write(ENCODERS[self.framing](Line(req_id, message, payload)))
 
     async def run(self):
         _, self.line_protocol = await self.loop.connect_read_pipe(
@@ -88,7 +98,7 @@ class RunnerSupport:
                     if line is None:
                         self.running = False
                     elif line.req_id:
-                        await self._handle_request(line)
+                        self.executor.execute(self._handle_request(line))
                     else:   
                         await self._handle_message(line)
             await self.executor.wait()
@@ -100,15 +110,16 @@ class RunnerSupport:
         handler = getattr(self, '{}_request_handler'.format(line.message), None)
         response_payload = {'error': None, 'error_tb': None, 'error_message': None,'payload': None}
         try:
-            assert asyncio.iscoroutinefunction(handler)
+            assert asyncio.iscoroutinefunction(handler), \
+                'unknown request {}'.format(line.message)
             handler_result = await handler(line.payload)
             response_payload['response'] = handler_result
         except Exception as ex:
             tb = traceback.extract_tb(ex.__traceback__)
-            response_payload['error'] = str(ex)
+            response_payload['error'] = type(ex).__name__
             response_payload['error_tb'] = traceback.format_list(tb)
             response_payload['error_message'] = str(ex)
-        self.sendline('response', req_id=line.req_id, payload=response_payload)
+        self.sendline(LINE_RESPONSE, req_id=line.req_id, payload=response_payload)
 
     async def _handle_message(self, line):
         handler_name = '{}_message_handler'.format(line.message)
@@ -122,7 +133,9 @@ class RunnerSupport:
         self.env = payload['env']
         self.config = payload['subsystem_config']
         self.executor.execute(self.run_coro())
-        self.sendline(LINE_STARTED)
+        framing = choose_framing(payload.get('framing'))
+        self.sendline(LINE_STARTED, {'framing': framing})
+        self.framing = framing
 
     def _handle_stop_signal(self, signame):
         self.running = False
@@ -130,7 +143,7 @@ class RunnerSupport:
 
 def runner_main(runner, logfile, debug=False):
     logging.basicConfig(level=debug and logging.DEBUG or logging.INFO, 
-        handlers=[LineLoggingHandler(runner.pipe_stream)])
+        handlers=[LineLoggingHandler(runner)])
     os.setpgid(os.getpid(), os.getpid())
 
     loop = asyncio.get_event_loop()
@@ -2,9 +2,11 @@
 #
 # See the file LICENCE for copying permission.
 
-from athome import Message, MESSAGE_EVT, MESSAGE_SHUTDOWN, MESSAGE_START
+from athome import Message, MESSAGE_EVT, MESSAGE_SHUTDOWN, MESSAGE_START,\
+    event_id
 from athome.system import SystemModule
 from athome.lib.locator import Cache, NameError
+from athome.lib.queues import POLICY_BLOCK
 from athome.core import Core
 
 
@@ -13,29 +15,87 @@ class SubsystemModule(SystemModule):
     EVENT_START = 'athome_started'
     EVENT_STOP = 'athome_stopping'
     EVENT_SHUTDOWN = 'athome_shutdown'
+    EVENTS = ()
+    DEPENDS = ('logging',)
+    MESSAGE_BATCH = 1
 
     def __init__(self, name):
         super().__init__(name)
         self.core = Core()
         self.cache = Cache()
+        self.message_batch = self.MESSAGE_BATCH
+        self._start_event = event_id(self.EVENT_START)
+        self._stop_event = event_id(self.EVENT_STOP)
+        self._shutdown_event = event_id(self.EVENT_SHUTDOWN)
+
+    def configure_queue(self, maxsize=0, policy=POLICY_BLOCK, batch=None):
+        """Bound message_queue, 'batch' > 1 enables on_messages() delivery"""
+
+        super().configure_queue(maxsize, policy)
+        if batch:
+            assert isinstance(batch, int) and batch > 0
+            self.message_batch = batch
 
     async def message_cycle(self):
         message = Message(MESSAGE_START, None, None)
         while message.type != MESSAGE_SHUTDOWN:
-            message = await self.message_queue.get()
-            await self.on_message(message)
+            if self.message_batch > 1:
+                batch = await self._next_batch()
+                await self.on_messages(batch)
+                message = batch[-1]
+            else:
+                message = await self.message_queue.get()
+                await self.on_message(message)
+
+    async def _next_batch(self):
+        """Wait for a message then drain up to message_batch messages"""
+
+        message = await self.message_queue.get()
+        result = [message]
+        while message.type != MESSAGE_SHUTDOWN \
+                and len(result) < self.message_batch \
+                and not self.message_queue.empty():
+            message = self.message_queue.get_nowait()
+            result.append(message)
+        return result
+
+    async def on_messages(self, batch):
+        """Handle a list of messages, batched mode only"""
+
+        for msg in batch:
+            await self.on_message(msg)
 
     async def on_message(self, msg):
         self.debug('subsystem %s got msg %s', self.name, msg)
         if not self.is_failed():
             if msg.type == MESSAGE_EVT:
-                if msg.value == self.EVENT_START:
-                    self.start()
-                elif msg.value == self.EVENT_STOP: 
+                if msg.event == self._start_event:
+                    self.core.request_start(self)
+                elif msg.event == self._stop_event: 
                     self.stop()
-                elif msg.value == self.EVENT_SHUTDOWN:
+                elif msg.event == self._shutdown_event:
                     self.shutdown()
 
+    def _after_started(self):
+        super()._after_started()
+        self.core.subsystem_started(self)
+
+    def _after_failed(self):
+        super()._after_failed()
+        self.core.subsystem_failed(self)
+
+    def subscriptions(self):
+        """Names of the events this subsystem handles"""
+
+        return (self.EVENT_START, self.EVENT_STOP, self.EVENT_SHUTDOWN)\
+            + tuple(self.EVENTS)
+
+    def subscribe(self, *events):
+        self.core.subscribe(self, *events)
+
+    def unsubscribe(self, *events):
+        self.core.unsubscribe(self, *events)
+
     def _find_logger(self):
         result = None
         try:
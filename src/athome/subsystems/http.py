@@ -3,21 +3,46 @@
 # See the file LICENCE for copying permission.
 
 
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import socket
+import stat
+import time
+from collections import OrderedDict
+from contextlib import suppress
 from functools import partial
 
 import aiohttp
 from aiohttp import web
 
+from athome import MESSAGE_EVT
 from athome.core import Core
-from athome.lib.locator import Cache, NameError
+from athome.lib.feeds import Feed, DEFAULT_BUFFER
+from athome.lib.locator import Cache, NameError, WATCH_REGISTER
 from athome.lib.management import ManagedObject, managed
+from athome.lib.metrics import CONTENT_TYPE as CT_METRICS, Exposition, Histogram
+from athome.lib.routing import WILDCARD
 from athome.subsystem import SubsystemModule
+from athome.system import SystemModule, add_state_listener, remove_state_listener
 
 LOGGER = logging.getLogger(__name__)
 
 CT_JSON = 'application/json'
+CT_EVENT_STREAM = 'text/event-stream'
+
+DEFAULT_BACKLOG = 100
+DEFAULT_KEEPALIVE_TIMEOUT = 75
+DEFAULT_SHUTDOWN_TIMEOUT = 10
+DEFAULT_FEED_POLL_INTERVAL = 1
+
+# Routes of long lived streams, whose duration isn't a request latency
+FEED_ROUTE_PREFIX = '/feed/'
+
+# Distinguishes version based ETags of different runs
+ETAG_EPOCH = '{:x}'.format(int(time.time() * 1000))
 
 async def decode(request):
     try:
@@ -40,45 +65,136 @@ def error_outcome(response, msg, code=-1):
     response['status'] = msg
 
 
-def find_managed_core():
-    core_path = 'core'
-    managed_path = 'managed/{}'.format(core_path)
-    cache = Cache()
-    try:
-        managed = cache.lookup(managed_path)
-    except NameError as ex:
-        core = Core()
-        managed = ManagedObject(core)
-        cache.register(managed_path, managed)
-    return managed
+def manage(target, path):
+    """Factory of the ManagedObject at 'path', wrapping 'target'"""
+
+    return ManagedObject(target)
+
 
+async def find_managed(target):
+    """Return the ManagedObject of the Cache object at path 'target'"""
 
-def find_managed_subsystem(request):
     cache = Cache()
-    name = request.match_info['name']
-    subsystem_path = 'subsystem/{}'.format(name)
-    managed_path = 'managed/{}'.format(subsystem_path)
-    try:
-        managed = cache.lookup(managed_path)
-    except NameError as ex:
-        subsystem = cache.lookup(subsystem_path)
-        managed = ManagedObject(subsystem)
-        cache.register(managed_path, managed)
-    return managed
+    obj = Core() if target == 'core' else cache.lookup(target)
+    return await cache.async_lookup('managed/{}'.format(target), partial(manage, obj))
+
+
+async def find_managed_core():
+    return await find_managed('core')
+
+
+async def find_managed_subsystem(request):
+    return await find_managed('subsystem/{}'.format(request.match_info['name']))
+
+
+def invalidate_managed(event, path, obj):
+    """Drop the managed wrapper of a replaced or unregistered object"""
+
+    if event != WATCH_REGISTER:
+        with suppress(NameError):
+            Cache().unregister('managed/{}'.format(path))
+
+
+def version_etag(*versions):
+    return '"{}-{}"'.format(ETAG_EPOCH, '-'.join(str(version) for version in versions))
+
+
+def opaque_tag(etag):
+    """'etag' without the weak indicator"""
+
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def not_modified(request, etag):
+    """True if the client 'If-None-Match' header weakly matches 'etag'"""
+
+    header = request.headers.get('If-None-Match')
+    result = False
+    if header:
+        tags = [opaque_tag(tag.strip()) for tag in header.split(',')]
+        result = '*' in tags or opaque_tag(etag) in tags
+    return result
+
+
+def json_response(request, make_body, etag=None):
+    """Serve the JSON bytes of make_body() with an ETag, 304 if the client has it
+
+    Without 'etag' the ETag is a digest of the body, otherwise the body is
+    only built when the client copy is stale. Bodies of at least
+    'compress_min_size' bytes, when configured, are compressed and the
+    ETag is weak, since gzip and identity bodies share it.
+
+    """
+
+    body = None
+    if etag is None:
+        body = make_body()
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+    min_size = request.app['subsystem'].config.get('compress_min_size')
+    if min_size is not None:
+        etag = 'W/' + etag
+    if not_modified(request, etag):
+        result = web.Response(status=304, headers={'ETag': etag})
+    else:
+        if body is None:
+            body = make_body()
+        result = web.Response(body=body, content_type=CT_JSON, headers={'ETag': etag})
+        if min_size is not None and len(body) >= min_size:
+            result.enable_compression()
+    return result
+
+
+def object_etag(managed, volatile=''):
+    """Version based ETag of the managed object, None if it is unversioned
+
+    'volatile' are the JSON members of its volatile properties, the ETag
+    includes their digest.
+
+    """
+
+    result = None
+    if managed.version is not None:
+        versions = [id(managed.obj), managed.version]
+        if volatile:
+            versions.append(hashlib.sha1(volatile.encode('utf-8')).hexdigest()[:16])
+        result = version_etag(*versions)
+    return result
+
+
+def snapshot_response(request, managed):
+    volatile = managed.volatile_members()
+    etag = object_etag(managed, volatile)
+    return json_response(request, partial(managed.snapshot, volatile), etag)
+
+
+def property_response(request, managed, property_):
+    etag = None
+    if property_ not in managed.info.volatile_properties:
+        etag = object_etag(managed)
+
+    def make_body():
+        return json.dumps(managed.get_property(property_)).encode('utf-8')
+
+    return json_response(request, make_body, etag)
 
 
 async def get_subsystem_idx_handler(request):
-    json_ = json.dumps(Cache().lookup('subsystem'))
-    return web.json_response(json_)
+    def make_body():
+        paths = []
+        with suppress(NameError):
+            paths = Cache().list('subsystem', depth=1)
+        return json.dumps(paths).encode('utf-8')
+
+    return json_response(request, make_body, version_etag(Cache().subtree_version('subsystem')))
 
 
 async def get_subsystem_handler(request):
-    managed = find_managed_subsystem(request)
-    return web.json_response(managed.json())
+    managed = await find_managed_subsystem(request)
+    return snapshot_response(request, managed)
 
 
 async def post_subsystem_handler(request):
-    managed = find_managed_subsystem(request)
+    managed = await find_managed_subsystem(request)
     method = request.match_info['method']
     args = await decode(request)
     result = prepare_outcome()
@@ -92,41 +208,69 @@ async def post_subsystem_handler(request):
 
 
 async def get_core_handler(request):
-    managed = find_managed_core()
-    return web.json_response(managed.json())
+    managed = await find_managed_core()
+    return snapshot_response(request, managed)
 
 
 async def get_property_core_handler(request):
-    managed = find_managed_core()
-    property_ = request.match_info['property']
-    property_value = managed.get_property(property_)
-    json_ = json.dumps(property_value)
-    return web.json_response(json_)
+    managed = await find_managed_core()
+    return property_response(request, managed, request.match_info['property'])
 
 
 async def get_property_subsystem_handler(request):
-    managed = find_managed_subsystem(request)
-    property_ = request.match_info['property']
-    property_value = managed.get_property(property_)
-    json_ = json.dumps(property_value)
-    return web.json_response(json_) 
+    managed = await find_managed_subsystem(request)
+    return property_response(request, managed, request.match_info['property'])
 
 
-async def get_subsystem_handler(request):
-    managed = find_managed_subsystem(request)
+async def cached_invoke(managed, target, method):
+    """Invoke 'method' without arguments, sharing results of cacheable methods
+
+    Results of methods with a 'cache_ttl' are kept in the Cache under
+    'results/<target>/<method>', concurrent calls on a stale entry share a
+    single invocation.
+
+    """
+
+    info = managed.methods.get(method)
+    if info and info.cache_ttl:
+        async def invoke(path):
+            # wrapped, None can't be registered in Cache
+            return (await managed.async_invoke(method),)
+
+        path = 'results/{}/{}'.format(target, method)
+        result = (await Cache().async_lookup(path, invoke, info.cache_ttl))[0]
+    else:
+        result = await managed.async_invoke(method)
+    return result
+
+
+async def get_method_subsystem_handler(request):
+    """Invoke a method without arguments, or read the property of that name
+
+    The '/subsystem/{name}/{property}' route has the same pattern and is
+    shadowed by this one, so properties are served from here.
+
+    """
+
+    managed = await find_managed_subsystem(request)
     method = request.match_info['method']
-    result = prepare_outcome()
-    try:
-        call_result = await managed.async_invoke(method)
-        result['data'] = call_result
-    except Exception as ex:
-        error_outcome(result, repr(ex))
-    result = json.dumps(result)
-    return web.json_response(result)
+    if method not in managed.methods and method in managed.read_properties:
+        response = property_response(request, managed, method)
+    else:
+        target = 'subsystem/{}'.format(request.match_info['name'])
+        result = prepare_outcome()
+        try:
+            call_result = await cached_invoke(managed, target, method)
+            result['data'] = call_result
+        except Exception as ex:
+            error_outcome(result, repr(ex))
+        result = json.dumps(result)
+        response = web.json_response(result)
+    return response
 
 
 async def post_core_handler(request):
-    managed = find_managed_core()
+    managed = await find_managed_core()
     result = prepare_outcome()
     try:
         method = request.match_info['method']
@@ -144,25 +288,339 @@ async def post_core_handler(request):
     return web.json_response(result)
 
 
+async def run_operation(managed, operation):
+    result = prepare_outcome()
+    try:
+        if 'property' in operation:
+            result['data'] = managed.get_property(operation['property'])
+        else:
+            result['data'] = await managed.async_invoke(operation['method'],
+                                                        operation.get('args', []))
+    except Exception as ex:
+        error_outcome(result, repr(ex))
+    return result
+
+
+async def run_target_operations(target, operations, results):
+    """Run the operations on 'target' in order, storing their outcomes"""
+
+    try:
+        managed = await find_managed(target)
+    except Exception as ex:
+        managed = None
+        for index, operation in operations:
+            results[index] = prepare_outcome()
+            error_outcome(results[index], repr(ex))
+    if managed:
+        for index, operation in operations:
+            results[index] = await run_operation(managed, operation)
+
+
+async def post_batch_handler(request):
+    """Run a list of {target, method|property, args} operations
+
+    Operations on the same target run in order, distinct targets run
+    concurrently. The response lists one outcome per operation.
+
+    """
+
+    operations = await decode(request)
+    if not isinstance(operations, list)\
+            or not all(isinstance(op, dict) and 'target' in op
+                       and ('method' in op or 'property' in op)
+                       for op in operations):
+        raise aiohttp.web.HTTPBadRequest()
+    targets = OrderedDict()
+    for index, operation in enumerate(operations):
+        targets.setdefault(operation['target'], []).append((index, operation))
+    results = [None] * len(operations)
+    await asyncio.gather(*[run_target_operations(target, target_operations, results)
+                           for target, target_operations in targets.items()])
+    return web.json_response(results)
+
+
+def feed_topics(request):
+    return request.query.getall('topic', [WILDCARD])
+
+
+async def close_on_disconnect(response, subsystem, client):
+    """Consume incoming websocket messages until the peer goes away"""
+
+    async for _ in response:
+        pass
+    subsystem.disconnect_feed(client)
+
+
+async def websocket_feed_handler(request):
+    """Stream events and state changes as websocket text messages"""
+
+    subsystem = request.app['subsystem']
+    response = web.WebSocketResponse()
+    await response.prepare(request)
+    client = subsystem.connect_feed(feed_topics(request))
+    receiver = asyncio.ensure_future(close_on_disconnect(response, subsystem, client))
+    try:
+        item = await client.get()
+        while item is not None:
+            await response.send_str(json.dumps(item, default=repr))
+            item = await client.get()
+    finally:
+        subsystem.disconnect_feed(client)
+        receiver.cancel()
+        await response.close()
+    return response
+
+
+async def close_on_transport_lost(request, subsystem, client):
+    """Poll the connection of 'request' until the peer goes away"""
+
+    interval = subsystem.config.get('feed_poll_interval', DEFAULT_FEED_POLL_INTERVAL)
+    transport = request.transport
+    while transport is not None and not transport.is_closing():
+        await asyncio.sleep(interval)
+        transport = request.transport
+    subsystem.disconnect_feed(client)
+
+
+async def sse_feed_handler(request):
+    """Stream events and state changes as server-sent events"""
+
+    subsystem = request.app['subsystem']
+    response = web.StreamResponse()
+    response.content_type = CT_EVENT_STREAM
+    response.headers['Cache-Control'] = 'no-cache'
+    await response.prepare(request)
+    client = subsystem.connect_feed(feed_topics(request))
+    watcher = asyncio.ensure_future(close_on_transport_lost(request, subsystem, client))
+    try:
+        item = await client.get()
+        while item is not None:
+            frame = 'event: {}\ndata: {}\n\n'.format(item['type'], json.dumps(item, default=repr))
+            await response.write(frame.encode('utf-8'))
+            item = await client.get()
+    except ConnectionResetError:
+        LOGGER.debug('event stream client went away')
+    finally:
+        subsystem.disconnect_feed(client)
+        watcher.cancel()
+    return response
+
+
+def route_name(request):
+    """Route pattern of 'request', the same for every instance of the route"""
+
+    result = 'unmatched'
+    resource = request.match_info.route.resource
+    if resource is not None:
+        info = resource.get_info()
+        result = info.get('formatter') or info.get('path') or result
+    return result
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Record latency, status and in-flight count of every request"""
+
+    subsystem = request.app['subsystem']
+    route = request.method, route_name(request)
+    status = 500
+    subsystem.in_flight += 1
+    begin = time.perf_counter()
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as ex:
+        status = ex.status
+        raise
+    finally:
+        subsystem.in_flight -= 1
+        subsystem.observe_request(route, status, time.perf_counter() - begin)
+
+
+def system_modules():
+    """Core and the active subsystems"""
+
+    yield Core()
+    with suppress(NameError):
+        for _, obj in Cache().walk('subsystem'):
+            if isinstance(obj, SystemModule):
+                yield obj
+
+
+def expose_modules(exposition):
+    modules = list(system_modules())
+    queues = [(module.name, module.queue_stats) for module in modules]
+    exposition.family('athome_queue_depth', 'gauge', 'Messages waiting in the module queue')
+    for name, stats in queues:
+        exposition.sample('athome_queue_depth', stats['size'], {'module': name})
+    for key in ('dropped', 'coalesced', 'blocked'):
+        metric = 'athome_queue_{}_total'.format(key)
+        exposition.family(metric, 'counter', 'Events {} by the module queue'.format(key))
+        for name, stats in queues:
+            exposition.sample(metric, stats[key], {'module': name})
+    exposition.family('athome_executor_jobs', 'gauge', 'Jobs running in the module executor')
+    for module in modules:
+        exposition.sample('athome_executor_jobs', len(module.executor), {'module': module.name})
+    exposition.family('athome_executor_jobs_total', 'counter', 'Jobs started by the module executor')
+    for module in modules:
+        exposition.sample('athome_executor_jobs_total', module.executor.executed, {'module': module.name})
+    exposition.family('athome_executor_failed_total', 'counter', 'Jobs failed in the module executor')
+    for module in modules:
+        exposition.sample('athome_executor_failed_total', module.executor.failed, {'module': module.name})
+
+
+async def get_metrics_handler(request):
+    subsystem = request.app['subsystem']
+    exposition = Exposition()
+    exposition.family('athome_http_requests_in_flight', 'gauge', 'Requests being served')
+    exposition.sample('athome_http_requests_in_flight', subsystem.in_flight)
+    exposition.family('athome_http_request_duration_seconds', 'histogram', 'Request latency by route')
+    for (method, route), histogram in sorted(subsystem.latency.items()):
+        exposition.histogram('athome_http_request_duration_seconds', histogram,
+                             {'method': method, 'route': route})
+    exposition.family('athome_http_responses_total', 'counter', 'Responses by route and status')
+    for (method, route, status), count in sorted(subsystem.responses.items()):
+        exposition.sample('athome_http_responses_total', count,
+                          {'method': method, 'route': route, 'status': status})
+    exposition.family('athome_feed_clients', 'gauge', 'Connected feed clients')
+    exposition.sample('athome_feed_clients', len(subsystem.feed))
+    expose_modules(exposition)
+    return web.Response(body=exposition.text().encode('utf-8'),
+                        headers={'Content-Type': CT_METRICS})
+
+
+def listeners(config):
+    """Listener configurations, the 'addr'/'port' pair first if present
+
+    A listener is either {'unix': path} or {'addr': host, 'port': port}
+    with optional 'reuse_port', both accept a 'backlog'.
+
+    """
+
+    result = []
+    if 'port' in config:
+        result.append({'addr': config.get('addr'), 'port': config['port']})
+    result.extend(config.get('listeners', ()))
+    return result
+
+
+def remove_stale_socket(path):
+    """Unlink the unix socket at 'path' unless some process listens on it"""
+
+    with suppress(FileNotFoundError):
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                LOGGER.warning('socket %s is in use, not removed', path)
+            except ConnectionRefusedError:
+                os.unlink(path)
+            finally:
+                probe.close()
+
+
 class Subsystem(SubsystemModule):
-    """Subsystem embedding http"""
+    """Subsystem embedding http
+
+    While feed clients are connected it receives every event, so queued
+    events are handled in batches of up to MESSAGE_BATCH.
+
+    """
+
+    MESSAGE_BATCH = 32
 
     def __init__(self, name):
         super().__init__(name)
         self.app = None
+        self.handler = None
+        self.servers = []
+        self.feed = None
+        self.in_flight = 0
+        self.latency = dict()
+        self.responses = dict()
+
+    def observe_request(self, route, status, elapsed):
+        """Count a response, feed streams are kept out of the latency histograms"""
+
+        if not route[1].startswith(FEED_ROUTE_PREFIX):
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = Histogram()
+            histogram.observe(elapsed)
+        key = route + (status,)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+    def connect_feed(self, topics):
+        """Connect a feed client, receiving every event while any is connected"""
+
+        if not self.feed:
+            self.subscribe(WILDCARD)
+            add_state_listener(self.publish_state)
+        return self.feed.connect(topics)
+
+    def disconnect_feed(self, client):
+        self.feed.disconnect(client)
+        self._feed_idle()
+
+    def _feed_idle(self):
+        if not self.feed:
+            self.unsubscribe(WILDCARD)
+            remove_state_listener(self.publish_state)
+
+    def publish_state(self, module, state):
+        name = 'state/{}/{}'.format(module.name, state)
+        self.feed.publish(name, {
+            'type': 'state',
+            'name': name,
+            'data': {'module': module.name, 'state': state}
+        })
+        self._feed_idle()
+
+    def _publish_event(self, msg):
+        self.feed.publish(msg.value, {'type': 'event', 'name': msg.value, 'data': msg.data})
+
+    async def on_message(self, msg):
+        if msg.type == MESSAGE_EVT and self.feed:
+            self._publish_event(msg)
+            self._feed_idle()
+        await super().on_message(msg)
+
+    async def on_messages(self, batch):
+        """Publish a batch of events to the feed, then handle lifecycle events"""
+
+        if self.feed:
+            for msg in batch:
+                if msg.type == MESSAGE_EVT:
+                    self._publish_event(msg)
+            self._feed_idle()
+        for msg in batch:
+            await super().on_message(msg)
 
     def on_start(self):
         """Instantiate a fresh server"""
 
         self.core.emit('http_starting')
+        self.cache.watch('subsystem', invalidate_managed)
 
-        self.app = aiohttp.web.Application(loop=self.core.loop)
+        self.feed = Feed(self.config.get('feed_buffer', DEFAULT_BUFFER))
+        self.app = aiohttp.web.Application(loop=self.core.loop,
+                                           middlewares=[metrics_middleware])
+        self.app['subsystem'] = self
         self.app.router.add_route('GET', '/core', 
             get_core_handler)
         self.app.router.add_route('POST', '/core/{method}', 
             post_core_handler)
         self.app.router.add_route('GET', '/core/{property}', 
             get_property_core_handler)
+        self.app.router.add_route('POST', '/batch',
+            post_batch_handler)
+        self.app.router.add_route('GET', '/metrics',
+            get_metrics_handler)
+        self.app.router.add_route('GET', '/feed/ws',
+            websocket_feed_handler)
+        self.app.router.add_route('GET', '/feed/sse',
+            sse_feed_handler)
         self.app.router.add_route('GET', '/subsystem', 
             get_subsystem_idx_handler)
         self.app.router.add_route('GET', '/subsystem/{name}', 
@@ -170,18 +628,58 @@ class Subsystem(SubsystemModule):
         self.app.router.add_route('POST', '/subsystem/{name}/{method}', 
             post_subsystem_handler)
         self.app.router.add_route('GET', '/subsystem/{name}/{method}', 
-            get_subsystem_handler)
+            get_method_subsystem_handler)
         self.app.router.add_route('GET', '/subsystem/{name}/{property}', 
             get_property_subsystem_handler)
 
         def create_server_success(future):
             self.started()
-        self.executor.execute(self.core.loop.create_server(
-                                           self.app.make_handler(),
-                                           self.config['addr'],
-                                           self.config['port']
-                                           ), create_server_success)
-    
+
+        def create_server_error(exc):
+            self.fail()
+        self.executor.execute(self.start_servers(), create_server_success, create_server_error)
+
+    async def start_servers(self):
+        """Listen on every configured tcp and unix socket"""
+
+        loop = self.core.loop
+        self.handler = self.app.make_handler(
+            keepalive_timeout=self.config.get('keepalive_timeout', DEFAULT_KEEPALIVE_TIMEOUT),
+            tcp_keepalive=self.config.get('tcp_keepalive', True))
+        try:
+            for listener in listeners(self.config):
+                backlog = listener.get('backlog', self.config.get('backlog', DEFAULT_BACKLOG))
+                if 'unix' in listener:
+                    remove_stale_socket(listener['unix'])
+                    server = await loop.create_unix_server(
+                        self.handler, listener['unix'], backlog=backlog)
+                else:
+                    server = await loop.create_server(
+                        self.handler, listener.get('addr'), listener['port'],
+                        backlog=backlog, reuse_port=listener.get('reuse_port'))
+                self.servers.append(server)
+        except Exception:
+            await self.close_servers()
+            raise
+
+    async def close_servers(self):
+        for server in self.servers:
+            server.close()
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+        for listener in listeners(self.config):
+            if 'unix' in listener:
+                remove_stale_socket(listener['unix'])
+
+    async def stop_servers(self):
+        """Stop listening, then let pending requests complete"""
+
+        await self.close_servers()
+        await self.app.shutdown()
+        await self.handler.shutdown(self.config.get('shutdown_timeout', DEFAULT_SHUTDOWN_TIMEOUT))
+        await self.app.cleanup()
+
     def after_started(self):
         self.emit('http_started')
 
@@ -190,7 +688,11 @@ class Subsystem(SubsystemModule):
         def shutdown_success(future):
             self.stopped()
 
-        self.executor.execute(self.app.shutdown(), shutdown_success)
+        self.cache.unwatch('subsystem', invalidate_managed)
+        self.feed.close()
+        self._feed_idle()
+
+        self.executor.execute(self.stop_servers(), shutdown_success)
 
     def after_stopped(self):
         self.emit('http_stopped')
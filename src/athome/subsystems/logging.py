@@ -12,6 +12,8 @@ LOGGER = logging.getLogger(__name__)
 class LoggingSubsystem(SubsystemModule):
     """Logging subsystem"""
 
+    DEPENDS = ()
+
     def __init__(self, name):
         super().__init__(name)
         self._logger = logging.getLogger()
@@ -20,6 +22,16 @@ class LoggingSubsystem(SubsystemModule):
         """Perform subsystem initialization"""
         logging.config.dictConfig(self.config)
 
+    def on_start(self):
+        """Nothing to start, logging is configured at initialization"""
+        self.loop.call_soon(self.started)
+
+    def on_stop(self):
+        self.loop.call_soon(self.stopped)
+
+    def after_stopped(self):
+        pass
+
     def log(self, level , name, message, *params, **kwparams):
         logger = logging.getLogger(name)
         logger.log(level, message, *params, **kwparams)
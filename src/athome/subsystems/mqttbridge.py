@@ -188,9 +188,7 @@ class Republisher():
 class Subsystem(SubsystemModule):
     """MQTT Bridge subsystem"""
 
-    EVENT_START = 'mqtt_started'
-    EVENT_STOP = 'mqtt_stopping'
-    EVENT_SHUTDOWN = 'athome_shutdown'
+    DEPENDS = ('logging', 'hbmqtt')
 
     def __init__(self, name):
         super().__init__(name)
@@ -21,4 +21,5 @@ class TasksSubsystem(ProcSubsystem):
         return await self.line_execute('list_tasks')
 
     list_tasks.managed = 'list_tasks'
+    list_tasks.cache_ttl = 5
 
@@ -8,6 +8,8 @@ import logging
 from transitions import Machine
 
 from athome.lib.jobs import Executor
+from athome.lib.management import volatile
+from athome.lib.queues import MessageQueue, POLICY_BLOCK
 
 from athome import Message,\
     MESSAGE_EVT,\
@@ -18,6 +20,19 @@ from athome import Message,\
 
 LOGGER = logging.getLogger(__name__)
 
+_state_listeners = []
+
+
+def add_state_listener(listener):
+    """Invoke listener(module, state) upon every SystemModule state change"""
+
+    _state_listeners.append(listener)
+
+
+def remove_state_listener(listener):
+    if listener in _state_listeners:
+        _state_listeners.remove(listener)
+
 
 class SystemModule():
     """Base class for all athome system modules"""
@@ -87,21 +102,25 @@ class SystemModule():
                 'stopping'
             ],
             'dest':'failed',
-            'before': ['_on_fail']
+            'before': ['_on_fail'],
+            'after': ['_after_failed']
         }
     ]
 
     def __init__(self, name):
         self.name = name
+        self.version = 0
         self.machine = Machine(model=self,
                                states=SystemModule.states,
                                transitions=SystemModule.transitions,
                                initial='loaded')
+        for state in self.machine.states.values():
+            state.add_callback('enter', '_state_changed')
         self.loop = None
         self.env = None
         self.config = None
         self.executor = Executor(self.loop)
-        self.message_queue = asyncio.Queue()
+        self.message_queue = MessageQueue()
         self.message_task = asyncio.ensure_future(self._wrap_message_cycle(), loop=self.loop)
         self._logger = None
 
@@ -109,6 +128,21 @@ class SystemModule():
         await self.message_cycle()
         await self.executor.wait(0.5)
 
+    def configure_queue(self, maxsize=0, policy=POLICY_BLOCK):
+        """Bound message_queue to 'maxsize' events, 0 means unbounded"""
+
+        self.message_queue.configure(maxsize, policy)
+
+    @property
+    @volatile
+    def queue_stats(self):
+        return self.message_queue.stats()
+
+    def _state_changed(self, *args, **kwargs):
+        self.version += 1
+        for listener in tuple(_state_listeners):
+            listener(self, self.state)
+
     def _on_initialize(self, loop, env, config):
         """Before 'initialize' callback"""
 
@@ -200,6 +234,11 @@ class SystemModule():
 
         pass
 
+    def _after_failed(self):
+        """After 'fail' callback"""
+
+        pass
+
     def _find_logger(self):
         pass
 
@@ -208,7 +247,7 @@ class SystemModule():
         assert msg and isinstance(msg, str)
         logger = self._find_logger()
         if logger:
-            logger.log('{}.{}'.format(__name__, self.__class__.__name__), level, msg, *args, **kwargs)
+            logger.log(level, '{}.{}'.format(__name__, self.__class__.__name__), msg, *args, **kwargs)
     
     def debug(self, msg, *args, **kwargs):
         self._log(logging.DEBUG, msg, *args, **kwargs)
@@ -0,0 +1,5 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+__all__ = ['eventbus', 'lineprotocol', 'locator']
@@ -0,0 +1,197 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""Core event bus benchmark
+
+Measure Core -> subsystem event delivery throughput, emit to handle
+latency and memory per queued event for a matrix of subsystem counts and
+payload sizes. Core is a singleton, so every scenario runs in its own
+interpreter. Run from the 'src' directory:
+
+    python -m benchmarks.eventbus --output eventbus.json
+
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from athome import Message, MESSAGE_EVT, event_id
+from athome.core import Core
+from athome.lib.queues import MessageQueue
+from athome.subsystem import SubsystemModule
+
+MODULE = 'benchmarks.eventbus'
+
+BENCH_EVENT = 'bench_event'
+BENCH_EVENT_ID = event_id(BENCH_EVENT)
+
+DEFAULT_SUBSYSTEMS = '1,10,50'
+DEFAULT_PAYLOADS = '0,1024,65536'
+DEFAULT_EVENTS = 10000
+DEFAULT_BURST = 100
+MEMORY_SAMPLES = 10000
+# bound on payload bytes held while sampling queued event sizes
+MEMORY_BYTES = 16 * 1024 * 1024
+
+
+class SinkSubsystem(SubsystemModule):
+    """Subsystem recording emit to handle latency of bench events"""
+
+    EVENTS = (BENCH_EVENT,)
+    DEPENDS = ()
+
+    expected = 0
+    done = None
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.latencies = []
+
+    def on_start(self):
+        self.loop.call_soon(self.started)
+
+    def on_stop(self):
+        self.loop.call_soon(self.stopped)
+
+    def after_stopped(self):
+        pass
+
+    async def on_message(self, msg):
+        if msg.event == BENCH_EVENT_ID:
+            self.latencies.append(time.perf_counter() - msg.data[0])
+            if len(self.latencies) == self.expected:
+                SinkSubsystem.done.release()
+        else:
+            await super().on_message(msg)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def queued_event_size(payload):
+    """Average traced bytes per event held in a MessageQueue
+
+    Each event carries its own 'payload' bytes, as events published by
+    different sources would; large payloads are sampled fewer times, so
+    that about MEMORY_BYTES of payload are held at most.
+
+    """
+
+    samples = min(MEMORY_SAMPLES, max(100, MEMORY_BYTES // max(payload, 1)))
+    queue = MessageQueue()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(samples):
+        data = bytes(payload)
+        queue.put_nowait(Message(MESSAGE_EVT, BENCH_EVENT, (time.perf_counter(), data)))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / samples
+
+
+async def run_scenario(loop, subsystems, payload, events, burst):
+    core = Core()
+    config = {'subsystem': {
+        'sink{}'.format(index): {
+            'enable': True,
+            'class': '{}.SinkSubsystem'.format(__name__),
+            'config': {}
+        } for index in range(subsystems)
+    }}
+    SinkSubsystem.expected = events
+    SinkSubsystem.done = asyncio.Semaphore(0)
+    core.initialize(loop, {}, config)
+    core.start()
+    while not core.startup_complete():
+        await asyncio.sleep(0.01)
+
+    data = b'x' * payload
+    begin = time.perf_counter()
+    for index in range(events):
+        core.emit(BENCH_EVENT, (time.perf_counter(), data))
+        if index % burst == 0:
+            await asyncio.sleep(0)
+    for _ in range(subsystems):
+        await SinkSubsystem.done.acquire()
+    elapsed = time.perf_counter() - begin
+
+    latencies = [latency
+                 for name in core.subsystems
+                 for latency in core._cache.lookup('subsystem/' + name).latencies]
+    return {
+        'subsystems': subsystems,
+        'payload': payload,
+        'events': events,
+        'elapsed': elapsed,
+        'events_per_sec': events / elapsed,
+        'deliveries_per_sec': events * subsystems / elapsed,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p99': percentile(latencies, 0.99),
+        'bytes_per_queued_event': queued_event_size(payload)
+    }
+
+
+def run_matrix(args):
+    results = []
+    for subsystems in [int(n) for n in args.subsystems.split(',')]:
+        for payload in [int(n) for n in args.payloads.split(',')]:
+            output = subprocess.check_output([
+                sys.executable, '-m', MODULE, '--scenario',
+                '--subsystems', str(subsystems),
+                '--payloads', str(payload),
+                '--events', str(args.events),
+                '--burst', str(args.burst)
+            ], stderr=subprocess.DEVNULL)
+            result = json.loads(output.decode('utf-8'))
+            print('{subsystems:4d} subsystems {payload:7d}B payload: '
+                  '{events_per_sec:10.0f} evt/s p50 {latency_p50:.6f}s '
+                  'p99 {latency_p99:.6f}s {bytes_per_queued_event:.0f}B/evt'
+                  .format(**result), file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the Core event bus')
+    parser.add_argument('--subsystems', default=DEFAULT_SUBSYSTEMS, help='Comma separated subsystem counts')
+    parser.add_argument('--payloads', default=DEFAULT_PAYLOADS, help='Comma separated payload sizes in bytes')
+    parser.add_argument('--events', type=int, default=DEFAULT_EVENTS, help='Events emitted per scenario')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help='Events emitted between yields')
+    parser.add_argument('--output', help='Write JSON results to file instead of stdout')
+    parser.add_argument('--scenario', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.scenario:
+        loop = asyncio.get_event_loop()
+        result = loop.run_until_complete(run_scenario(
+            loop, int(args.subsystems), int(args.payloads), args.events, args.burst))
+        print(json.dumps(result))
+    else:
+        results = {
+            'benchmark': 'eventbus',
+            'timestamp': time.time(),
+            'python': sys.version,
+            'results': run_matrix(args)
+        }
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
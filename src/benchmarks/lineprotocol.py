@@ -0,0 +1,100 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""Line protocol framing benchmark
+
+Compare newline JSON lines with length-prefixed marshal frames: encoding
+time, parsing time through LineProtocol fed in pipe sized chunks, and
+bytes on the wire, for several payload shapes. Run from the 'src'
+directory:
+
+    python -m benchmarks.lineprotocol --output lineprotocol.json
+
+"""
+
+import argparse
+import json
+import sys
+import time
+import timeit
+
+from athome.lib.lineprotocol import ENCODERS, FRAMING_JSON, FRAMING_MARSHAL,\
+    Line, LineProtocol
+
+DEFAULT_MESSAGES = 10000
+DEFAULT_CHUNK = 65536
+
+PAYLOADS = {
+    'response': lambda: {'error': None, 'error_tb': None, 'error_message': None,
+                         'response': [1, 2, 3]},
+    'log': lambda: {'name': 'athome.lib.taskrunner', 'level': 20,
+                    'message': 'scanned "tasks" directory\n' * 20},
+    'listing': lambda: {'error': None, 'response': [
+        {'name': 'task{}'.format(index), 'file': '/tasks/task{}.py'.format(index),
+         'mtime': 1500000000.0 + index, 'active': index % 2 == 0}
+        for index in range(500)
+    ]}
+}
+
+
+def parse(data, chunk):
+    lines = []
+    protocol = LineProtocol(lines.append)
+    for start in range(0, len(data), chunk):
+        protocol.data_received(data[start:start + chunk])
+    return lines
+
+
+def run_scenario(payload_name, framing, messages, chunk):
+    encoder = ENCODERS[framing]
+    lines = [Line(index, 'response', PAYLOADS[payload_name]()) for index in range(messages)]
+    begin = time.perf_counter()
+    data = b''.join(encoder(line) for line in lines)
+    encode_time = time.perf_counter() - begin
+    assert len(parse(data, chunk)) == messages
+    parse_time = min(timeit.repeat(lambda: parse(data, chunk), number=1, repeat=3))
+    return {
+        'payload': payload_name,
+        'framing': framing,
+        'messages': messages,
+        'bytes_per_message': len(data) / messages,
+        'encode_per_sec': messages / encode_time,
+        'parse_per_sec': messages / parse_time
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark line protocol framings')
+    parser.add_argument('--payloads', default=','.join(sorted(PAYLOADS)), help='Comma separated payload shapes')
+    parser.add_argument('--messages', type=int, default=DEFAULT_MESSAGES, help='Messages per scenario')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help='Bytes per data_received call')
+    parser.add_argument('--output', help='Write JSON results to file instead of stdout')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    for payload_name in args.payloads.split(','):
+        for framing in (FRAMING_JSON, FRAMING_MARSHAL):
+            result = run_scenario(payload_name, framing, args.messages, args.chunk)
+            print('{payload:10s} {framing:8s}: encode {encode_per_sec:10.0f}/s '
+                  'parse {parse_per_sec:10.0f}/s {bytes_per_message:8.0f}B/msg'.format(**result),
+                  file=sys.stderr)
+            results.append(result)
+    results = {
+        'benchmark': 'lineprotocol',
+        'timestamp': time.time(),
+        'python': sys.version,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""Locator Cache lookup benchmark
+
+Compare Cache.lookup, served by the flat path index, with the nested tree
+walk it replaces, for several path depths and registry sizes. Run from
+the 'src' directory:
+
+    python -m benchmarks.locator --output locator.json
+
+"""
+
+import argparse
+import json
+import sys
+import time
+import timeit
+
+from athome.lib.locator import Cache, normalize_path
+
+DEFAULT_DEPTHS = '2,4,8'
+DEFAULT_ENTRIES = '10,1000'
+DEFAULT_NUMBER = 100000
+
+
+def populate(cache, depth, entries):
+    paths = []
+    for index in range(entries):
+        path = '/'.join(['level{}'.format(level) for level in range(depth - 1)]
+                        + ['obj{}'.format(index)])
+        cache.register(path, object())
+        paths.append('/' + path + '/')
+    return paths
+
+
+def tree_lookup(cache, path):
+    """Cache.lookup as it was before the flat index"""
+
+    normalized_path = normalize_path.__wrapped__(path)
+    return cache._lookup(cache.root, normalized_path.split('/'), normalized_path)
+
+
+def run_scenario(depth, entries, number):
+    cache = Cache()
+    Cache.root.clear()
+    Cache.index.clear()
+    path = populate(cache, depth, entries)[entries // 2]
+    index_time = timeit.timeit(lambda: cache.lookup(path), number=number)
+    tree_time = timeit.timeit(lambda: tree_lookup(cache, path), number=number)
+    return {
+        'depth': depth,
+        'entries': entries,
+        'lookups': number,
+        'index_lookups_per_sec': number / index_time,
+        'tree_lookups_per_sec': number / tree_time,
+        'speedup': tree_time / index_time
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark locator Cache lookups')
+    parser.add_argument('--depths', default=DEFAULT_DEPTHS, help='Comma separated path depths')
+    parser.add_argument('--entries', default=DEFAULT_ENTRIES, help='Comma separated registry sizes')
+    parser.add_argument('--number', type=int, default=DEFAULT_NUMBER, help='Lookups per scenario')
+    parser.add_argument('--output', help='Write JSON results to file instead of stdout')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    for depth in [int(n) for n in args.depths.split(',')]:
+        for entries in [int(n) for n in args.entries.split(',')]:
+            result = run_scenario(depth, entries, args.number)
+            print('depth {depth:2d} entries {entries:6d}: index {index_lookups_per_sec:10.0f}/s '
+                  'tree {tree_lookups_per_sec:10.0f}/s x{speedup:.1f}'.format(**result),
+                  file=sys.stderr)
+            results.append(result)
+    results = {
+        'benchmark': 'locator',
+        'timestamp': time.time(),
+        'python': sys.version,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
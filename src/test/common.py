@@ -6,6 +6,21 @@ import asyncio
 
 from functools import partial
 
+from athome.lib.locator import Cache
+
+def reset_cache():
+    """Empty the Cache singleton and drop its options, return it"""
+
+    for registry in (Cache.root, Cache.index, Cache.expiry, Cache.lru,
+                     Cache.watchers, Cache.inflight, Cache.versions):
+        registry.clear()
+    Cache.version = 0
+    result = Cache()
+    result.factory = None
+    result.lru_size = None
+    return result
+
+
 class AsyncTest(unittest.TestCase):
 
     def setUp(self):
@@ -21,5 +36,23 @@ class AsyncTest(unittest.TestCase):
 
 
 class SubsystemTest(AsyncTest):
-    pass
+    """Test bound to a fresh Core, running its message cycle on self.loop"""
+
+    def setUp(self):
+        super().setUp()
+        from athome.core import Core
+        Core._Core__instance = None
+        self.core = Core()
+        self.core.loop = self.loop
+        self.modules = [self.core]
+
+    def tearDown(self):
+        from athome.core import Core
+        modules = self.modules + list(self.core._subsystems.values())
+        tasks = [module.message_task for module in modules]
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.wait(tasks))
+        Core._Core__instance = None
+        super().tearDown()
     
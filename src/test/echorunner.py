@@ -0,0 +1,30 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""Runner used by test_procsubsystem"""
+
+import asyncio
+
+from athome.lib.runnersupport import RunnerSupport, runner_main
+
+
+class EchoRunner(RunnerSupport):
+
+    def __init__(self):
+        super().__init__('echo')
+
+    async def run_coro(self):
+        pass
+
+    async def echo_request_handler(self, params):
+        await asyncio.sleep(params['delay'])
+        return params['value']
+
+    async def fail_request_handler(self, params):
+        raise ValueError(params)
+
+
+if __name__ == '__main__':
+    runner = EchoRunner()
+    runner_main(runner, 'echorunner.log', False)
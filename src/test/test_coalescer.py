@@ -0,0 +1,58 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from athome import Message, MESSAGE_EVT, MESSAGE_START
+from athome.lib.coalescer import Coalescer, KEY_DATA
+
+
+def evt(name, data=None):
+    return Message(MESSAGE_EVT, name, data)
+
+
+class CoalescerTest(unittest.TestCase):
+    """Test event coalescing"""
+
+    def test_by_name(self):
+        coalescer = Coalescer(1)
+        for i in range(3):
+            self.assertTrue(coalescer.add(evt('republisher_started', i), 0))
+        coalescer.add(evt('http_started'), 0.5)
+        self.assertEqual(coalescer.timeout(0.5), 0.5)
+        result = coalescer.flush()
+        self.assertEqual([(m.value, m.data, m.count) for m in result],
+                         [('republisher_started', 2, 3), ('http_started', None, 1)])
+        self.assertIsNone(coalescer.timeout(2))
+
+    def test_by_data(self):
+        coalescer = Coalescer(1, KEY_DATA)
+        coalescer.add(evt('status', 'on'), 0)
+        coalescer.add(evt('status', 'off'), 0)
+        coalescer.add(evt('status', 'on'), 0)
+        self.assertFalse(coalescer.add(evt('status', {'unhashable': 1}), 0))
+        result = coalescer.flush()
+        self.assertEqual([(m.data, m.count) for m in result],
+                         [('off', 1), ('on', 2)])
+
+    def test_events(self):
+        coalescer = Coalescer(1, events=['republisher_*'])
+        self.assertTrue(coalescer.add(evt('republisher_started'), 0))
+        self.assertFalse(coalescer.add(evt('http_started'), 0))
+        self.assertFalse(coalescer.add(Message(MESSAGE_START, None, None), 0))
+
+    def test_timeout(self):
+        coalescer = Coalescer(1)
+        self.assertIsNone(coalescer.timeout(0))
+        coalescer.add(evt('a'), 10)
+        coalescer.add(evt('a'), 10.5)
+        self.assertEqual(coalescer.timeout(10.5), 0.5)
+        self.assertEqual(coalescer.timeout(12), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
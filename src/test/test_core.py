@@ -0,0 +1,166 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import asyncio
+import unittest
+
+from test import common
+from athome.lib.coalescer import Coalescer
+from athome.lib.locator import Cache, Lazy
+from athome.subsystem import SubsystemModule
+
+
+STARTED = []
+
+
+class Stub(SubsystemModule):
+    """Subsystem running 'delay' seconds after start, or failing"""
+
+    def on_start(self):
+        if self.config.get('fail'):
+            self.loop.call_soon(self.fail)
+        else:
+            self.loop.call_later(self.config.get('delay', 0), self.started)
+
+    def after_started(self):
+        STARTED.append(self.name)
+
+
+def subsystem_config(**options):
+    result = {'enable': True, 'class': 'test.test_core.Stub', 'config': {}}
+    result.update(options)
+    return result
+
+
+class Sink:
+    """Subscriber collecting the events delivered by Core"""
+
+    def __init__(self):
+        self.message_queue = asyncio.Queue()
+
+    def drain(self):
+        result = []
+        while not self.message_queue.empty():
+            msg = self.message_queue.get_nowait()
+            result.append((msg.value, msg.data, msg.count))
+        return result
+
+
+class CoreTest(common.SubsystemTest):
+    """Test Core event delivery and subsystem lifecycle"""
+
+    def setUp(self):
+        super().setUp()
+        common.reset_cache()
+        STARTED.clear()
+
+    def run_for(self, seconds):
+        self.loop.run_until_complete(asyncio.sleep(seconds))
+
+    def initialize(self, **subsystems):
+        self.core.initialize(self.loop, {}, {'subsystem': subsystems})
+
+    def test_start_order(self):
+        self.initialize(http=subsystem_config(depends=['bus']),
+                        store=subsystem_config(config={'delay': 0.05}),
+                        bus=subsystem_config(depends=['store']),
+                        tasks=subsystem_config(depends=[]))
+        self.core.start()
+        self.run_for(0.02)
+        self.assertEqual(STARTED, ['tasks'])
+        self.assertTrue(self.core._subsystems['store'].is_starting())
+        self.assertTrue(self.core._subsystems['http'].is_ready())
+        self.run_for(0.1)
+        self.assertEqual(STARTED, ['tasks', 'store', 'bus', 'http'])
+        self.assertTrue(self.core.startup_complete())
+
+    def test_failed_dependency(self):
+        self.initialize(http=subsystem_config(depends=['bus']),
+                        store=subsystem_config(config={'fail': True}),
+                        bus=subsystem_config(depends=['store']),
+                        tasks=subsystem_config(depends=[]))
+        with self.assertLogs('athome.core', 'ERROR') as logs:
+            self.core.start()
+            self.run_for(0.02)
+        self.assertEqual(STARTED, ['tasks'])
+        subsystems = self.core._subsystems
+        self.assertTrue(all(subsystems[name].is_failed() for name in ('store', 'bus', 'http')))
+        self.assertEqual(self.core._start_requests, set())
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('failed dependencies: store', logs.output[0])
+
+    def test_unknown_start_request(self):
+        self.initialize()
+        unknown = Stub('unknown')
+        self.modules.append(unknown)
+        with self.assertLogs('athome.core', 'WARNING'):
+            self.core.request_start(unknown)
+        self.assertEqual(self.core._start_requests, set())
+
+    def test_dependencies(self):
+        with self.assertLogs('athome.core', 'WARNING') as logs:
+            self.initialize(http=subsystem_config(depends=['store', 'mail']),
+                            store=subsystem_config(lazy=True, depends=[]),
+                            mail=subsystem_config(enable=False),
+                            tasks=subsystem_config(lazy=True))
+        self.assertEqual(list(self.core._subsystems), ['store', 'http'])
+        self.assertEqual(self.core._dependencies['http'], ['store'])
+        self.assertIsInstance(Cache.root['subsystem']['tasks'], Lazy)
+        self.assertEqual(logs.output, ['WARNING:athome.core:http depends on mail, which is not enabled'])
+
+    def test_lazy_lookup(self):
+        self.initialize(stub=subsystem_config(lazy=True))
+        self.assertEqual(self.core.subsystems, ['stub'])
+        self.assertIsInstance(Cache.root['subsystem']['stub'], Lazy)
+        stub = Cache().lookup('subsystem/stub')
+        self.assertIsInstance(stub, Stub)
+        self.assertTrue(stub.is_ready())
+        self.assertIs(Cache().lookup('subsystem/stub'), stub)
+
+    def test_lazy_trigger(self):
+        self.initialize(stub=subsystem_config(lazy=True, triggers=['stub_*']))
+        self.core.emit('other_event')
+        self.run_for(0.01)
+        self.assertEqual(list(self.core._subsystems), [])
+        self.core.emit('stub_wanted')
+        self.run_for(0.01)
+        self.assertEqual(list(self.core._subsystems), ['stub'])
+        self.assertEqual(self.core._lazy_triggers.lookup('stub_wanted'), ())
+
+    def test_lazy_dependency(self):
+        self.initialize(first=subsystem_config(lazy=True, depends=['second']),
+                        second=subsystem_config(lazy=True))
+        Cache().lookup('subsystem/first')
+        self.assertEqual(list(self.core._subsystems), ['second', 'first'])
+        self.assertEqual(self.core._startup['first']['depends'], ['second'])
+
+    def test_lazy_retry(self):
+        self.initialize(stub=subsystem_config(lazy=True, triggers=['stub_wanted'],
+                                              **{'class': 'test.test_core.Missing'}))
+        self.core.emit('stub_wanted')
+        self.run_for(0.01)
+        self.assertEqual(list(self.core._subsystems), [])
+        self.core.config['subsystem']['stub']['class'] = 'test.test_core.Stub'
+        self.core.emit('stub_wanted')
+        self.run_for(0.01)
+        self.assertEqual(list(self.core._subsystems), ['stub'])
+
+    def test_coalesce_window(self):
+        self.core._coalescer = Coalescer(0.1, 'data', events=['status'])
+        sink = Sink()
+        self.core.subscribe(sink, 'status', 'tick')
+        for data in ('on', 'off', 'on'):
+            self.core.emit('status', data)
+        self.core.emit('tick')
+        self.run_for(0.02)
+        self.assertEqual(sink.drain(), [('tick', None, 1)])
+        self.run_for(0.15)
+        self.assertEqual(sink.drain(), [('status', 'off', 1), ('status', 'on', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
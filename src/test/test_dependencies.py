@@ -0,0 +1,72 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from athome.lib.dependencies import resolve_levels, split_eager, DependencyError
+
+
+class ResolveLevelsTest(unittest.TestCase):
+    """Test dependency graph sorting"""
+
+    def test_levels(self):
+        result = resolve_levels({
+            'mqttbridge': ['logging', 'hbmqtt'],
+            'http': ['logging'],
+            'hbmqtt': ['logging'],
+            'tasks': ['logging'],
+            'logging': []
+        })
+        self.assertEqual(result, [
+            ['logging'],
+            ['hbmqtt', 'http', 'tasks'],
+            ['mqttbridge']
+        ])
+
+    def test_empty(self):
+        self.assertEqual(resolve_levels({}), [])
+
+    def test_cycle(self):
+        with self.assertRaises(DependencyError):
+            resolve_levels({'a': ['b'], 'b': ['c'], 'c': ['a'], 'd': []})
+
+    def test_unknown(self):
+        with self.assertRaises(DependencyError):
+            resolve_levels({'a': ['b']})
+
+
+class SplitEagerTest(unittest.TestCase):
+    """Test promotion of lazy dependencies of eager names"""
+
+    DEPENDS = {
+        'http': ['logging', 'store'],
+        'store': ['cache'],
+        'cache': [],
+        'tasks': ['logging'],
+        'logging': []
+    }
+
+    def test_split(self):
+        calls = []
+
+        def depends_of(name):
+            calls.append(name)
+            return self.DEPENDS[name]
+
+        eager, lazy = split_eager(['logging', 'http', 'store', 'cache', 'tasks'],
+                                  {'store', 'cache', 'tasks'}, depends_of)
+        self.assertEqual(eager, ['logging', 'http', 'store', 'cache'])
+        self.assertEqual(lazy, ['tasks'])
+        self.assertEqual(sorted(calls), sorted(eager))
+
+    def test_unknown(self):
+        eager, lazy = split_eager(['http'], set(), lambda name: ['missing'])
+        self.assertEqual((eager, lazy), (['http'], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
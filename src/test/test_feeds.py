@@ -0,0 +1,47 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from test import common
+from athome.lib.feeds import Feed
+
+
+class FeedTest(common.AsyncTest):
+    """Test feed fan out"""
+
+    def test_topics(self):
+        feed = Feed()
+        every, states = feed.connect(), feed.connect(['state/*', 'http_started'])
+        for name in ('state/http/running', 'http_started', 'tick'):
+            feed.publish(name, name)
+        self.assertEqual(every.queue.qsize(), 3)
+        self.assertEqual(self.loop.run_until_complete(states.get()), 'state/http/running')
+        self.assertEqual(self.loop.run_until_complete(states.get()), 'http_started')
+        self.assertTrue(states.queue.empty())
+
+    def test_slow_client_dropped(self):
+        feed = Feed(buffer=2)
+        slow, fast = feed.connect(), feed.connect(['fast'])
+        for name in ('a', 'b', 'c'):
+            feed.publish(name, name)
+        self.assertEqual(feed.clients, [fast])
+        self.assertEqual(feed.dropped, 1)
+        self.assertTrue(slow.closed)
+        self.assertIsNone(self.loop.run_until_complete(slow.get()))
+
+    def test_close(self):
+        feed = Feed()
+        client = feed.connect()
+        feed.publish('a', 'a')
+        feed.close()
+        self.assertEqual(len(feed), 0)
+        self.assertIsNone(self.loop.run_until_complete(client.get()))
+
+
+if __name__ == '__main__':
+    unittest.main()
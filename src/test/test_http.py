@@ -0,0 +1,470 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+
+from test import common
+from athome import Message, MESSAGE_EVT
+from athome import system
+from athome.lib.feeds import Feed
+from athome.lib.locator import Cache
+from athome.lib.management import ManagedObject, managed, volatile
+from athome.subsystems import http
+
+
+class Request:
+
+    def __init__(self, body=None, headers=None, config=None, **match_info):
+        self.body = body
+        self.match_info = match_info
+        self.headers = headers or dict()
+        self.app = {'subsystem': SimpleNamespace(config=config or dict())}
+
+    async def json(self):
+        return self.body
+
+
+class Counter:
+
+    def __init__(self):
+        self.calls = []
+        self.version = 0
+
+    @property
+    def count(self):
+        return len(self.calls)
+
+    @managed()
+    async def bump(self, tag):
+        self.calls.append(tag)
+        await asyncio.sleep(0)
+        return len(self.calls)
+
+    @managed(cache_ttl=60)
+    async def slow_count(self):
+        self.calls.append('slow')
+        await asyncio.sleep(0.01)
+        return len(self.calls)
+
+
+class Gauge(Counter):
+
+    def __init__(self):
+        super().__init__()
+        self.level = 0
+
+    @property
+    @volatile
+    def current_level(self):
+        return self.level
+
+
+class BatchTest(common.AsyncTest):
+    """Test the http batch endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        common.reset_cache()
+        self.first, self.second = Counter(), Counter()
+        Cache().register('subsystem/first', self.first)
+        Cache().register('subsystem/second', self.second)
+
+    def batch(self, operations):
+        response = self.loop.run_until_complete(
+            http.post_batch_handler(Request(operations)))
+        return json.loads(response.text)
+
+    def test_batch(self):
+        results = self.batch([
+            {'target': 'subsystem/first', 'method': 'bump', 'args': ['a']},
+            {'target': 'subsystem/second', 'method': 'bump', 'args': ['x']},
+            {'target': 'subsystem/first', 'method': 'bump', 'args': ['b']},
+            {'target': 'subsystem/first', 'property': 'count'},
+            {'target': 'subsystem/first', 'method': 'missing'},
+            {'target': 'subsystem/none', 'property': 'count'}
+        ])
+        self.assertEqual([result['data'] for result in results[:4]], [1, 1, 2, 2])
+        self.assertEqual(self.first.calls, ['a', 'b'])
+        self.assertEqual([result['outcome'] for result in results], [0, 0, 0, 0, -1, -1])
+
+    def test_bad_batch(self):
+        self.assertRaises(aiohttp.web.HTTPBadRequest, self.batch, {'target': 'core'})
+        self.assertRaises(aiohttp.web.HTTPBadRequest, self.batch, [{'method': 'stop'}])
+
+
+class ConditionalGetTest(common.AsyncTest):
+    """Test ETags and If-None-Match on management endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        common.reset_cache()
+        self.counter = Counter()
+        Cache().register('subsystem/counter', self.counter)
+
+    def get(self, handler, etag=None, config=None):
+        headers = {'If-None-Match': etag} if etag else None
+        request = Request(headers=headers, config=config, name='counter', property='count')
+        return self.loop.run_until_complete(handler(request))
+
+    def test_subsystem(self):
+        response = self.get(http.get_subsystem_handler)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(json.loads(response.text)['count'], 0)
+        etag = response.headers['ETag']
+        self.assertEqual(self.get(http.get_subsystem_handler, etag).status, 304)
+        self.counter.version += 1
+        self.assertEqual(self.get(http.get_subsystem_handler, etag).status, 200)
+
+    def test_property(self):
+        etag = self.get(http.get_property_subsystem_handler).headers['ETag']
+        self.assertEqual(self.get(http.get_property_subsystem_handler, etag).status, 304)
+
+    def test_index(self):
+        response = self.get(http.get_subsystem_idx_handler)
+        self.assertEqual(json.loads(response.text), ['subsystem/counter'])
+        etag = response.headers['ETag']
+        self.assertEqual(self.get(http.get_subsystem_idx_handler, etag).status, 304)
+        Cache().register('subsystem/other', Counter())
+        self.assertEqual(self.get(http.get_subsystem_idx_handler, etag).status, 200)
+
+    def test_volatile(self):
+        gauge = Gauge()
+        Cache().register('subsystem/gauge', gauge)
+        request = Request(name='gauge')
+        response = self.loop.run_until_complete(http.get_subsystem_handler(request))
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('"{}-'.format(http.ETAG_EPOCH)))
+        request = Request(headers={'If-None-Match': etag}, name='gauge')
+        self.assertEqual(self.loop.run_until_complete(http.get_subsystem_handler(request)).status, 304)
+        gauge.level = 1
+        response = self.loop.run_until_complete(http.get_subsystem_handler(request))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(json.loads(response.text)['current_level'], 1)
+
+    def test_weak_etag(self):
+        config = {'compress_min_size': 0}
+        etag = self.get(http.get_subsystem_handler, config=config).headers['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(self.get(http.get_subsystem_handler, etag, config).status, 304)
+        self.assertEqual(self.get(http.get_subsystem_handler, etag[2:], config).status, 304)
+
+    def test_index_scoped(self):
+        etag = self.get(http.get_subsystem_idx_handler).headers['ETag']
+        call = http.cached_invoke(ManagedObject(self.counter), 'subsystem/counter', 'slow_count')
+        self.loop.run_until_complete(call)
+        Cache().register('managed/subsystem/counter', ManagedObject(self.counter))
+        self.assertEqual(self.get(http.get_subsystem_idx_handler, etag).status, 304)
+
+    def test_index_empty(self):
+        common.reset_cache()
+        response = self.get(http.get_subsystem_idx_handler)
+        self.assertEqual((response.status, json.loads(response.text)), (200, []))
+        etag = response.headers['ETag']
+        self.assertEqual(self.get(http.get_subsystem_idx_handler, etag).status, 304)
+
+    def test_digest_etag(self):
+        self.counter.version = None
+        first = self.get(http.get_subsystem_handler).headers['ETag']
+        self.assertEqual(self.get(http.get_subsystem_handler, first).status, 304)
+        self.counter.calls.append('a')
+        self.assertNotEqual(self.get(http.get_subsystem_handler, first).headers['ETag'], first)
+
+
+class CachedInvokeTest(common.AsyncTest):
+    """Test result caching of managed methods"""
+
+    def setUp(self):
+        super().setUp()
+        common.reset_cache()
+
+    def test_cached_invoke(self):
+        counter = Counter()
+        managed = ManagedObject(counter)
+        calls = [http.cached_invoke(managed, 'subsystem/counter', 'slow_count') for _ in range(3)]
+        results = self.loop.run_until_complete(asyncio.gather(*calls))
+        self.assertEqual(results, [1, 1, 1])
+        self.assertEqual(Cache.index['results/subsystem/counter/slow_count'], (1,))
+        self.assertIn('results/subsystem/counter/slow_count', Cache.expiry)
+        Cache.expiry['results/subsystem/counter/slow_count'] = 0
+        call = http.cached_invoke(managed, 'subsystem/counter', 'slow_count')
+        self.assertEqual(self.loop.run_until_complete(call), 2)
+
+
+class FeedSubsystem:
+
+    def __init__(self):
+        self.config = {'feed_poll_interval': 0.01}
+        self.feed = Feed()
+        self.disconnected = 0
+
+    def connect_feed(self, topics):
+        return self.feed.connect(topics)
+
+    def disconnect_feed(self, client):
+        self.disconnected += 1
+        self.feed.disconnect(client)
+
+
+async def ping_handler(request):
+    return web.Response(text='pong')
+
+
+class ServerTest(common.SubsystemTest):
+    """Serve ROUTES of a test app through make_handler, as the subsystem does"""
+
+    ROUTES = ()
+    MIDDLEWARES = ()
+
+    def setUp(self):
+        super().setUp()
+        common.reset_cache()
+        self.subsystem = self.make_subsystem()
+        self.loop.run_until_complete(self.start_server())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.stop_server())
+        super().tearDown()
+
+    def make_subsystem(self):
+        result = http.Subsystem('http')
+        self.modules.append(result)
+        result.config = {'feed_poll_interval': 0.01}
+        result.feed = Feed()
+        return result
+
+    async def start_server(self):
+        self.app = web.Application(middlewares=list(self.MIDDLEWARES))
+        self.app['subsystem'] = self.subsystem
+        for path, handler in self.ROUTES:
+            self.app.router.add_get(path, handler)
+        self.handler = self.app.make_handler()
+        self.server = await self.loop.create_server(self.handler, '127.0.0.1', 0)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.sockets[0].getsockname()[1])
+        self.session = aiohttp.ClientSession()
+
+    async def stop_server(self):
+        await self.session.close()
+        self.server.close()
+        await self.handler.shutdown(1)
+        await self.app.cleanup()
+
+
+class MetricsTest(ServerTest):
+    """Test request metrics and the /metrics endpoint"""
+
+    ROUTES = (('/ping', ping_handler), ('/metrics', http.get_metrics_handler),
+              ('/feed/sse', http.sse_feed_handler))
+    MIDDLEWARES = (http.metrics_middleware,)
+
+    async def scrape(self):
+        for path in ('/ping', '/ping', '/missing'):
+            async with self.session.get(self.url + path):
+                pass
+        response = await self.session.get(self.url + '/feed/sse')
+        while not self.subsystem.feed:
+            await asyncio.sleep(0.01)
+        response.close()
+        while self.subsystem.feed:
+            await asyncio.sleep(0.01)
+        async with self.session.get(self.url + '/metrics') as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+            return (await response.text()).splitlines()
+
+    def test_metrics(self):
+        lines = self.loop.run_until_complete(self.scrape())
+        self.assertEqual(self.subsystem.in_flight, 0)
+        self.assertIn('# TYPE athome_http_request_duration_seconds histogram', lines)
+        self.assertIn('athome_http_requests_in_flight 1', lines)
+        ping = 'method="GET",route="/ping"'
+        self.assertIn('athome_http_request_duration_seconds_bucket{le="+Inf",%s} 2' % ping, lines)
+        self.assertIn('athome_http_request_duration_seconds_count{%s} 2' % ping, lines)
+        buckets = [line for line in lines if line.startswith('athome_http_request_duration_seconds_bucket{')
+                   and ping in line]
+        self.assertEqual(len(buckets), len(http.Histogram().buckets) + 1)
+        self.assertIn('athome_http_responses_total{%s,status="200"} 2' % ping, lines)
+        self.assertIn('athome_http_responses_total{method="GET",route="unmatched",status="404"} 1', lines)
+        self.assertIn('athome_http_responses_total{method="GET",route="/feed/sse",status="200"} 1', lines)
+        self.assertFalse([line for line in lines if 'duration' in line and '/feed/sse' in line])
+        self.assertIn('athome_feed_clients 0', lines)
+        self.assertIn('athome_queue_depth{module="core"} 0', lines)
+
+
+class SseFeedTest(ServerTest):
+    """Test the server-sent events feed endpoint"""
+
+    ROUTES = (('/feed/sse', http.sse_feed_handler),)
+
+    def make_subsystem(self):
+        return FeedSubsystem()
+
+    async def wait_clients(self, count):
+        while len(self.subsystem.feed) != count:
+            await asyncio.sleep(0.01)
+
+    async def stream(self):
+        response = await self.session.get(self.url + '/feed/sse', params={'topic': 'tick'})
+        self.assertEqual(response.headers['Content-Type'], http.CT_EVENT_STREAM)
+        await self.wait_clients(1)
+        self.subsystem.feed.publish('tick', {'type': 'event', 'name': 'tick', 'data': 1})
+        self.assertEqual(await response.content.readline(), b'event: event\n')
+        frame = json.loads((await response.content.readline())[len('data: '):])
+        self.assertEqual(frame['data'], 1)
+        response.close()
+        await asyncio.wait_for(self.wait_clients(0), 1)
+
+    def test_disconnect(self):
+        self.loop.run_until_complete(self.stream())
+        self.assertGreaterEqual(self.subsystem.disconnected, 1)
+
+
+class ListenersTest(unittest.TestCase):
+    """Test http listener configuration"""
+
+    def test_listeners(self):
+        unix = {'unix': '/tmp/athome-test.sock'}
+        self.assertEqual(http.listeners({'addr': 'localhost', 'port': 8080, 'listeners': [unix]}),
+                         [{'addr': 'localhost', 'port': 8080}, unix])
+        self.assertEqual(http.listeners({'listeners': [unix]}), [unix])
+
+
+class WebsocketFeedTest(ServerTest):
+    """Test the websocket feed endpoint and feed subscriptions"""
+
+    ROUTES = (('/feed/ws', http.websocket_feed_handler),)
+
+    async def connect(self, *topics):
+        result = await self.session.ws_connect(self.url + '/feed/ws', params=[('topic', topic) for topic in topics])
+        while not self.subsystem.feed:
+            await asyncio.sleep(0.01)
+        return result
+
+    async def wait_idle(self):
+        while self.subsystem.feed:
+            await asyncio.sleep(0.01)
+
+    def assertIdle(self):
+        self.assertEqual(self.core._router.lookup('tick'), ())
+        self.assertNotIn(self.subsystem.publish_state, system._state_listeners)
+
+    async def receive_topics(self):
+        ws = await self.connect('tick', 'state/core/*')
+        self.assertEqual(self.core._router.lookup('tick'), (self.subsystem,))
+        self.assertIn(self.subsystem.publish_state, system._state_listeners)
+        await self.subsystem.on_message(Message(MESSAGE_EVT, 'other', None))
+        await self.subsystem.on_message(Message(MESSAGE_EVT, 'tick', 1))
+        self.core.initialize(self.loop, {}, {'subsystem': {}})
+        frames = [json.loads(await ws.receive_str()) for _ in range(3)]
+        await ws.close()
+        await asyncio.wait_for(self.wait_idle(), 1)
+        return frames
+
+    def test_topics(self):
+        frames = self.loop.run_until_complete(self.receive_topics())
+        self.assertEqual(frames[0], {'type': 'event', 'name': 'tick', 'data': 1})
+        self.assertEqual([frame['name'] for frame in frames[1:]],
+                         ['state/core/initializing', 'state/core/ready'])
+        self.assertEqual(frames[2]['data'], {'module': 'core', 'state': 'ready'})
+        self.assertIdle()
+
+    async def receive_batch(self):
+        ws = await self.connect('tick')
+        for data in range(3):
+            self.subsystem.message_queue.put_nowait(Message(MESSAGE_EVT, 'tick', data))
+        frames = [json.loads(await ws.receive_str()) for _ in range(3)]
+        await ws.close()
+        return frames
+
+    def test_batch(self):
+        self.assertEqual(self.subsystem.message_batch, http.Subsystem.MESSAGE_BATCH)
+        frames = self.loop.run_until_complete(self.receive_batch())
+        self.assertEqual([frame['data'] for frame in frames], [0, 1, 2])
+
+    async def receive_slow(self):
+        self.subsystem.feed.buffer = 2
+        ws = await self.connect()
+        for data in range(3):
+            self.subsystem.feed.publish('tick', {'type': 'event', 'name': 'tick', 'data': data})
+        message = await asyncio.wait_for(ws.receive(), 1)
+        await ws.close()
+        return message
+
+    def test_slow_client(self):
+        message = self.loop.run_until_complete(self.receive_slow())
+        self.assertEqual(message.type, aiohttp.WSMsgType.CLOSE)
+        self.assertEqual(self.subsystem.feed.dropped, 1)
+        self.assertEqual(len(self.subsystem.feed), 0)
+
+    async def close_client(self):
+        ws = await self.connect()
+        await ws.close()
+        await asyncio.wait_for(self.wait_idle(), 1)
+
+    def test_client_close(self):
+        self.loop.run_until_complete(self.close_client())
+        self.assertIdle()
+
+
+class ServersTest(common.SubsystemTest):
+    """Test http listeners on real sockets"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'athome.sock')
+        self.subsystem = http.Subsystem('http')
+        self.modules.append(self.subsystem)
+        self.subsystem.config = {'listeners': [
+            {'unix': self.path},
+            {'addr': '127.0.0.1', 'port': 0, 'reuse_port': True}
+        ]}
+        self.subsystem.app = web.Application()
+        self.subsystem.app.router.add_get('/ping', ping_handler)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    async def serve(self):
+        await self.subsystem.start_servers()
+        unix, tcp = self.subsystem.servers
+        port = tcp.sockets[0].getsockname()[1]
+        self.assertEqual(tcp.sockets[0].getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT), 1)
+        with self.assertLogs('athome.subsystems.http', 'WARNING'):
+            http.remove_stale_socket(self.path)
+        self.assertTrue(os.path.exists(self.path))
+        async with aiohttp.ClientSession() as session:
+            async with session.get('http://127.0.0.1:{}/ping'.format(port)) as response:
+                self.assertEqual(await response.text(), 'pong')
+        async with aiohttp.ClientSession(connector=aiohttp.UnixConnector(self.path)) as session:
+            async with session.get('http://athome/ping') as response:
+                self.assertEqual(await response.text(), 'pong')
+        await self.subsystem.stop_servers()
+
+    def test_servers(self):
+        self.loop.run_until_complete(self.serve())
+        self.assertEqual(self.subsystem.servers, [])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_socket(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        http.remove_stale_socket(self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
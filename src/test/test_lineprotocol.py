@@ -0,0 +1,44 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from athome.lib.lineprotocol import Line, LineProtocol, choose_framing,\
+    encode_frame, encode_line
+
+
+class LineProtocolTest(unittest.TestCase):
+    """Test newline JSON and marshal framing"""
+
+    def setUp(self):
+        self.lines = []
+        self.protocol = LineProtocol(self.lines.append)
+
+    def test_mixed_framing(self):
+        lines = [Line(None, 'started', {'framing': 'marshal'}),
+                 Line(1, 'response', {'response': [1, 2, 3]}),
+                 Line(2, 'response', {'response': 'x' * 1000})]
+        data = encode_line(lines[0]) + b'\n' + encode_frame(lines[1]) + encode_frame(lines[2])
+        self.protocol.data_received(data)
+        self.assertEqual(self.lines, lines)
+        self.assertEqual(len(self.protocol._buffer), 0)
+
+    def test_partial_data(self):
+        lines = [Line(1, 'log', {'message': 'a'}), Line(None, 'log', {'message': 'b'})]
+        data = encode_frame(lines[0]) + encode_line(lines[1])
+        for index in range(len(data)):
+            self.protocol.data_received(data[index:index + 1])
+        self.assertEqual(self.lines, lines)
+
+    def test_choose_framing(self):
+        self.assertEqual(choose_framing(['msgpack', 'marshal', 'json']), 'marshal')
+        self.assertEqual(choose_framing(['msgpack']), 'json')
+        self.assertEqual(choose_framing(None), 'json')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import asyncio
+import time
+import unittest
+
+from test import common
+from athome.lib.locator import Cache, Lazy, NameError, normalize_path,\
+    WATCH_REGISTER, WATCH_UNREGISTER, WATCH_REPLACE
+
+
+class CacheTest(unittest.TestCase):
+    """Test locator Cache"""
+
+    def setUp(self):
+        self.cache = common.reset_cache()
+
+    def tearDown(self):
+        self.cache.factory = None
+        self.cache.lru_size = None
+
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path('//a///b/'), 'a/b')
+        self.assertEqual(normalize_path('a/b'), 'a/b')
+
+    def test_register_lookup(self):
+        obj = object()
+        self.cache.register('/subsystem/http', obj)
+        self.assertIs(self.cache.lookup('subsystem/http'), obj)
+        self.assertIs(self.cache.lookup('//subsystem//http/'), obj)
+        self.assertIs(Cache.index['subsystem/http'], obj)
+        self.assertEqual(self.cache.lookup('subsystem'), {'http': obj})
+
+    def test_lookup_missing(self):
+        with self.assertRaises(NameError):
+            self.cache.lookup('subsystem/none')
+
+    def test_register_twice(self):
+        self.cache.register('subsystem/http', object())
+        with self.assertRaises(Exception):
+            self.cache.register('subsystem/http', object())
+
+    def test_lazy(self):
+        obj = object()
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return obj
+
+        self.cache.register('subsystem/lazy', Lazy(factory))
+        self.assertIs(self.cache.lookup('subsystem/lazy'), obj)
+        self.assertIs(self.cache.lookup('subsystem/lazy'), obj)
+        self.assertEqual(len(calls), 1)
+
+    def test_walk(self):
+        self.cache.register('subsystem/http', 1)
+        self.cache.register('subsystem/logging', 2)
+        self.cache.register('managed/subsystem/http', 3)
+        self.assertEqual(list(self.cache.walk()), [
+            ('managed/subsystem/http', 3),
+            ('subsystem/http', 1),
+            ('subsystem/logging', 2)
+        ])
+        self.assertEqual(list(self.cache.walk('/subsystem/')), [
+            ('subsystem/http', 1),
+            ('subsystem/logging', 2)
+        ])
+        self.assertEqual(list(self.cache.walk('subsystem/http')),
+                         [('subsystem/http', 1)])
+        with self.assertRaises(NameError):
+            list(self.cache.walk('missing'))
+
+    def test_list(self):
+        self.cache.register('subsystem/http', 1)
+        self.cache.register('subsystem/logging', 2)
+        self.cache.register('managed/subsystem/http', 3)
+        self.assertEqual(self.cache.list('subsystem'),
+                         ['subsystem/http', 'subsystem/logging'])
+        self.assertEqual(self.cache.list(depth=1), ['managed', 'subsystem'])
+        self.assertEqual(self.cache.list(depth=2),
+                         ['managed/subsystem', 'subsystem/http', 'subsystem/logging'])
+
+    def test_unregister(self):
+        obj = object()
+        self.cache.register('managed/subsystem/http', obj)
+        self.cache.register('managed/core', 1)
+        self.assertIs(self.cache.unregister('/managed/subsystem/http'), obj)
+        self.assertEqual(Cache.root, {'managed': {'core': 1}})
+        with self.assertRaises(NameError):
+            self.cache.lookup('managed/subsystem/http')
+        with self.assertRaises(NameError):
+            self.cache.unregister('managed/subsystem/http')
+
+    def test_replace(self):
+        self.assertIsNone(self.cache.replace('subsystem/http', 1))
+        self.assertEqual(self.cache.replace('subsystem/http', 2), 1)
+        self.assertEqual(self.cache.lookup('subsystem/http'), 2)
+        self.assertEqual(self.cache.lookup('subsystem'), {'http': 2})
+
+    def test_ttl(self):
+        self.cache.register('result/a', 1, ttl=0.05)
+        self.cache.register('result/b', 2, ttl=10)
+        self.assertEqual(self.cache.lookup('result/a'), 1)
+        time.sleep(0.06)
+        self.assertEqual(self.cache.list('result'), ['result/b'])
+        with self.assertRaises(NameError):
+            self.cache.lookup('result/a')
+        self.assertNotIn('result/a', Cache.expiry)
+
+    def test_lru(self):
+        class Factory:
+            def new(self, path):
+                return path.upper()
+
+        self.cache.factory = Factory()
+        self.cache.lru_size = 2
+        self.assertEqual(self.cache.lookup('f/a'), 'F/A')
+        self.cache.lookup('f/b')
+        self.cache.lookup('f/a')
+        self.cache.lookup('f/c')
+        self.assertEqual(self.cache.list('f'), ['f/a', 'f/c'])
+
+    def test_watch(self):
+        events = []
+
+        def callback(event, path, obj):
+            events.append((event, path, obj))
+
+        self.cache.watch('subsystem', callback)
+        self.cache.register('subsystem/http', 1)
+        self.cache.register('managed/subsystem/http', 2)
+        self.cache.replace('subsystem/http', 3)
+        self.cache.unregister('subsystem/http')
+        self.cache.register('subsystem/lazy', Lazy(lambda: 4))
+        self.cache.lookup('subsystem/lazy')
+        self.cache.unwatch('subsystem', callback)
+        self.cache.register('subsystem/logging', 5)
+        self.assertEqual([(e[0], e[1]) for e in events], [
+            (WATCH_REGISTER, 'subsystem/http'),
+            (WATCH_REPLACE, 'subsystem/http'),
+            (WATCH_UNREGISTER, 'subsystem/http'),
+            (WATCH_REGISTER, 'subsystem/lazy'),
+            (WATCH_REPLACE, 'subsystem/lazy')
+        ])
+        self.assertEqual(events[-1][2], 4)
+
+    def test_subtree_version(self):
+        self.assertEqual(self.cache.subtree_version('subsystem'), 0)
+        self.cache.register('subsystem/http', 1)
+        self.cache.register('results/subsystem/http/count', 2)
+        self.cache.unregister('results/subsystem/http/count')
+        self.assertEqual(self.cache.subtree_version('/subsystem/'), 1)
+        self.assertEqual(self.cache.subtree_version('results'), 2)
+        self.assertEqual(Cache.version, 3)
+
+
+class AsyncCacheTest(common.AsyncTest):
+    """Test locator Cache single flight creation"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = common.reset_cache()
+
+    def tearDown(self):
+        self.cache.factory = None
+        self.cache.lru_size = None
+        super().tearDown()
+
+    def test_async_lookup_single_flight(self):
+        calls = []
+
+        async def factory(path):
+            calls.append(path)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def run():
+            lookups = [self.cache.async_lookup('/managed/core/', factory) for _ in range(5)]
+            return await asyncio.gather(*lookups)
+
+        self.assertEqual(self.loop.run_until_complete(run()), [1] * 5)
+        self.assertEqual(calls, ['managed/core'])
+        self.assertEqual(Cache.inflight, {})
+        self.assertEqual(self.cache.lookup('managed/core'), 1)
+        self.assertEqual(self.loop.run_until_complete(self.cache.async_lookup('managed/core', factory)), 1)
+
+    def test_async_lookup_error(self):
+        calls = []
+
+        async def factory(path):
+            calls.append(path)
+            await asyncio.sleep(0.01)
+            raise ValueError(path)
+
+        async def run():
+            lookups = [self.cache.async_lookup('a/b', factory) for _ in range(3)]
+            return await asyncio.gather(*lookups, return_exceptions=True)
+
+        results = self.loop.run_until_complete(run())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(Cache.inflight, {})
+        self.assertRaises(NameError, self.cache.lookup, 'a/b')
+        self.assertRaises(ValueError, self.loop.run_until_complete, self.cache.async_lookup('a/b', factory))
+        self.assertEqual(len(calls), 2)
+
+    def test_async_lookup_default_factory(self):
+        class Factory:
+            def new(self, path):
+                return path.upper()
+
+        self.assertRaises(NameError, self.loop.run_until_complete, self.cache.async_lookup('a/b'))
+        self.cache.factory = Factory()
+        self.cache.lru_size = 1
+        self.assertEqual(self.loop.run_until_complete(self.cache.async_lookup('a/b', ttl=60)), 'A/B')
+        self.assertIn('a/b', Cache.expiry)
+        self.assertIn('a/b', Cache.lru)
+
+
+if __name__ == '__main__':
+    unittest.main()
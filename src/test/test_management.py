@@ -0,0 +1,123 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import json
+import unittest
+
+from test import common
+from athome.lib import management
+from athome.lib.management import ManagedObject, class_info, managed, volatile
+
+
+class Sample:
+
+    def __init__(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def double(self):
+        return self._value * 2
+
+    @managed()
+    async def add(self, amount):
+        self._value += amount
+        return self._value
+
+    @managed('reset', cache_ttl=5)
+    async def managed_reset(self):
+        self._value = 0
+
+    async def hidden(self):
+        pass
+
+
+class Versioned(Sample):
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.version = 0
+        self.reads = 0
+        self.ticks = 0
+
+    @property
+    def stable(self):
+        self.reads += 1
+        return self._value
+
+    @property
+    @volatile
+    def tick(self):
+        self.ticks += 1
+        return self.ticks
+
+
+class ManagementTest(common.AsyncTest):
+    """Test ManagedObject and its class metadata"""
+
+    def test_class_info(self):
+        info = class_info(Sample)
+        self.assertEqual(info.name, 'Sample')
+        self.assertEqual(info.read_properties, {'value', 'double'})
+        self.assertEqual(info.write_properties, {'value'})
+        self.assertEqual(set(info.methods), {'add', 'reset'})
+        self.assertEqual(info.methods['add'].params, ['amount'])
+        self.assertEqual(info.methods['reset'].orig_name, 'managed_reset')
+        self.assertEqual(info.methods['reset'].cache_ttl, 5)
+        self.assertIsNone(info.methods['add'].cache_ttl)
+
+    def test_class_info_cached(self):
+        first, second = ManagedObject(Sample(1)), ManagedObject(Sample(2))
+        self.assertIs(first.info, second.info)
+        self.assertIs(management._class_info[Sample], first.info)
+
+    def test_view(self):
+        obj = Sample(1)
+        view = ManagedObject(obj)
+        view.set_property('value', 3)
+        self.assertEqual(view.get_property('double'), 6)
+        self.assertEqual(self.loop.run_until_complete(view.async_invoke('add', [2])), 5)
+        self.loop.run_until_complete(view.async_invoke('reset'))
+        self.assertEqual(obj.value, 0)
+        result = json.loads(view.json())
+        self.assertEqual(result['__meta']['methods'], {'add': ['amount'], 'reset': []})
+        self.assertEqual(result['value'], 0)
+
+    def test_snapshot_cached(self):
+        obj = Versioned(1)
+        view = ManagedObject(obj)
+        self.assertEqual(class_info(Versioned).volatile_properties, {'tick'})
+        first = json.loads(view.snapshot().decode('utf-8'))
+        second = json.loads(view.snapshot().decode('utf-8'))
+        self.assertEqual(obj.reads, 1)
+        self.assertEqual((first['tick'], second['tick']), (1, 2))
+        self.assertEqual(second['stable'], 1)
+        members = view.volatile_members()
+        self.assertEqual(json.loads(view.snapshot(members).decode('utf-8'))['tick'], 3)
+        self.assertEqual(obj.ticks, 3)
+        view.set_property('value', 5)
+        self.assertEqual(obj.version, 1)
+        self.assertEqual(json.loads(view.json())['stable'], 5)
+        self.assertEqual(obj.reads, 2)
+
+    def test_snapshot_unversioned(self):
+        obj = Sample(1)
+        view = ManagedObject(obj)
+        self.assertEqual(json.loads(view.json())['value'], 1)
+        obj.value = 2
+        self.assertEqual(json.loads(view.json())['value'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
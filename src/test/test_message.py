@@ -0,0 +1,37 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from athome import Message, MESSAGE_EVT, MESSAGE_STOP, EVENT_NONE,\
+    event_id, event_name
+
+
+class MessageTest(unittest.TestCase):
+    """Test Message and event ids"""
+
+    def test_event_id(self):
+        evt_id = event_id('test_started')
+        self.assertEqual(event_id('test_' + 'started'), evt_id)
+        self.assertNotEqual(event_id('test_stopped'), evt_id)
+        self.assertEqual(event_name(evt_id), 'test_started')
+
+    def test_message(self):
+        msg = Message(MESSAGE_EVT, 'test_started', {'a': 1})
+        self.assertEqual(msg.event, event_id('test_started'))
+        self.assertEqual(msg.count, 1)
+        self.assertEqual(msg.data, {'a': 1})
+        self.assertFalse(hasattr(msg, '__dict__'))
+
+    def test_control_message(self):
+        msg = Message(MESSAGE_STOP, None)
+        self.assertEqual(msg.event, EVENT_NONE)
+        self.assertIsNone(msg.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
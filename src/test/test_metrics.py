@@ -0,0 +1,44 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from athome.lib.metrics import Exposition, Histogram, format_labels
+
+
+class MetricsTest(unittest.TestCase):
+    """Test histograms and text exposition"""
+
+    def test_histogram(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()), [('0.1', 2), ('1.0', 3), ('+Inf', 4)])
+        self.assertAlmostEqual(histogram.sum, 2.65)
+
+    def test_labels(self):
+        self.assertEqual(format_labels(None), '')
+        self.assertEqual(format_labels({'b': 'x"y', 'a': 1}), '{a="1",b="x\\"y"}')
+
+    def test_exposition(self):
+        histogram = Histogram((1.0,))
+        histogram.observe(0.5)
+        exposition = Exposition()
+        exposition.family('latency_seconds', 'histogram', 'Latency')
+        exposition.histogram('latency_seconds', histogram, {'route': '/core'})
+        self.assertEqual(exposition.text(), '\n'.join([
+            '# HELP latency_seconds Latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="1.0",route="/core"} 1',
+            'latency_seconds_bucket{le="+Inf",route="/core"} 1',
+            'latency_seconds_sum{route="/core"} 0.5',
+            'latency_seconds_count{route="/core"} 1'
+        ]) + '\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+from test import common
+from athome.lib.procsubsystem import ProcSubsystem, RequestError
+
+
+class ProcSubsystemTest(common.SubsystemTest):
+    """Test request multiplexing over the subprocess line protocol"""
+
+    FRAMING = ['marshal', 'json']
+
+    def setUp(self):
+        super().setUp()
+        self.subsystem = ProcSubsystem('echo', 'test.echorunner')
+        self.modules.append(self.subsystem)
+        self.subsystem.loop = self.loop
+        self.subsystem.env = {}
+        self.subsystem.config = {'request_timeout': 5, 'framing': self.FRAMING}
+        self.run_task = self.loop.create_task(self.subsystem.run())
+        while not self.subsystem.transport:
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def tearDown(self):
+        if self.subsystem.transport:
+            self.subsystem.transport.get_pipe_transport(0).close()
+        self.loop.run_until_complete(asyncio.wait_for(self.run_task, 5))
+        super().tearDown()
+
+    def execute(self, *requests):
+        return self.loop.run_until_complete(asyncio.gather(*requests, return_exceptions=True))
+
+    def echo(self, value, delay=0, timeout=None):
+        return self.subsystem.line_execute('echo', {'value': value, 'delay': delay}, timeout)
+
+    def test_concurrent_requests(self):
+        results = self.execute(self.echo('slow', 0.2), self.echo('fast'), self.echo(3, 0.1))
+        self.assertEqual(results, ['slow', 'fast', 3])
+        self.assertEqual(self.subsystem._pending, {})
+        self.assertEqual(self.subsystem.framing, 'marshal')
+
+    def test_errors(self):
+        error, timeout, result = self.execute(
+            self.subsystem.line_execute('fail', 'boom'),
+            self.echo('late', 1, timeout=0.1),
+            self.echo('ok'))
+        self.assertIsInstance(error, RequestError)
+        self.assertIn('boom', str(error))
+        self.assertIsInstance(timeout, asyncio.TimeoutError)
+        self.assertEqual(result, 'ok')
+
+    def test_unknown_command(self):
+        error, = self.execute(self.subsystem.line_execute('no_such_command'))
+        self.assertIsInstance(error, RequestError)
+        self.assertIn('no_such_command', str(error))
+
+
+class SpawnFailureTest(common.SubsystemTest):
+    """Test a subsystem whose subprocess can't be spawned"""
+
+    def test_spawn_failure(self):
+        subsystem = ProcSubsystem('echo', 'test.echorunner')
+        self.modules.append(subsystem)
+        subsystem.initialize(self.loop, {}, {})
+        with mock.patch.object(self.loop, 'subprocess_exec', side_effect=OSError('no exec')):
+            with self.assertLogs('athome.lib.procsubsystem', 'ERROR'):
+                subsystem.start()
+                self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertTrue(subsystem.is_failed())
+        self.assertIsNone(subsystem.transport)
+
+
+class JsonProcSubsystemTest(ProcSubsystemTest):
+    """Test request multiplexing with newline JSON framing"""
+
+    FRAMING = ['json']
+
+    def test_concurrent_requests(self):
+        self.assertEqual(self.execute(self.echo('a', 0.1), self.echo('b')), ['a', 'b'])
+        self.assertEqual(self.subsystem.framing, 'json')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from athome.lib import profiler
+
+
+class ProfilerTest(unittest.TestCase):
+    """Test the startup profiler"""
+
+    def tearDown(self):
+        profiler.disable()
+
+    def test_disabled(self):
+        profiler.mark('ignored')
+        with profiler.phase('ignored') as entry:
+            self.assertIsNone(entry)
+        self.assertIsNone(profiler.write_report(tempfile.gettempdir()))
+
+    def test_mark(self):
+        current = profiler.enable()
+        with profiler.phase('load'):
+            pass
+        profiler.mark('started')
+        self.assertEqual([phase['name'] for phase in current.phases], ['load', 'started'])
+        mark = current.phases[1]
+        self.assertEqual(mark['begin'], mark['end'])
+        self.assertGreaterEqual(mark['begin'], current.phases[0]['end'])
+
+    def test_write_report(self):
+        current = profiler.enable()
+        module = SimpleNamespace(name='http')
+        profiler.mark('athome_started')
+        profiler.state_changed(module, 'starting')
+        profiler.state_changed(module, 'running')
+        with tempfile.TemporaryDirectory() as directory:
+            json_path, text_path = profiler.write_report(directory)
+            self.assertIsNone(profiler.current())
+            with open(json_path) as json_file:
+                report = json.load(json_file)
+            self.assertEqual([phase['name'] for phase in report['phases']], ['athome_started'])
+            self.assertEqual([t['state'] for t in report['transitions']], ['starting', 'running'])
+            with open(text_path) as text_file:
+                waterfall = text_file.read()
+            self.assertIn('http:starting', waterfall)
+            self.assertIn('http:running', waterfall)
+            self.assertEqual(sorted(os.listdir(directory)),
+                             [profiler.REPORT_NAME + '.json', profiler.REPORT_NAME + '.txt'])
+        profiler.state_changed(module, 'stopping')
+        self.assertEqual(len(current.transitions), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
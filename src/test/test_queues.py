@@ -0,0 +1,98 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import asyncio
+import unittest
+
+from test import common
+
+from athome import Message, MESSAGE_EVT, MESSAGE_STOP
+from athome.lib import queues
+
+
+def evt(name, data=None):
+    return Message(MESSAGE_EVT, name, data)
+
+
+class MessageQueueTest(common.AsyncTest):
+    """Test bounded message queue policies"""
+
+    def drain(self, queue):
+        result = []
+        while not queue.empty():
+            result.append(queue.get_nowait())
+        return result
+
+    def test_unbounded(self):
+        queue = queues.MessageQueue()
+        for i in range(100):
+            queue.put_nowait(evt('a', i))
+        self.assertEqual(queue.qsize(), 100)
+        self.assertEqual(queue.dropped, 0)
+
+    def test_drop_newest(self):
+        queue = queues.MessageQueue(2, queues.POLICY_DROP_NEWEST)
+        for i in range(4):
+            queue.put_nowait(evt('a', i))
+        self.assertEqual([m.data for m in self.drain(queue)], [0, 1])
+        self.assertEqual(queue.dropped, 2)
+
+    def test_drop_oldest(self):
+        queue = queues.MessageQueue(2, queues.POLICY_DROP_OLDEST)
+        for i in range(4):
+            queue.put_nowait(evt('a', i))
+        self.assertEqual([m.data for m in self.drain(queue)], [2, 3])
+        self.assertEqual(queue.dropped, 2)
+
+    def test_coalesce(self):
+        queue = queues.MessageQueue(2, queues.POLICY_COALESCE)
+        queue.put_nowait(evt('a', 0))
+        queue.put_nowait(evt('b', 1))
+        queue.put_nowait(evt('a', 2))
+        queue.put_nowait(evt('c', 3))
+        self.assertEqual([(m.value, m.data) for m in self.drain(queue)],
+                         [('a', 2), ('c', 3)])
+        self.assertEqual(queue.coalesced, 1)
+        self.assertEqual(queue.dropped, 1)
+
+    def test_coalesce_order(self):
+        queue = queues.MessageQueue(3, queues.POLICY_COALESCE)
+        for name, data in (('on', 0), ('off', 1), ('level', 2), ('on', 3)):
+            queue.put_nowait(evt(name, data))
+        self.assertEqual([(m.value, m.data) for m in self.drain(queue)],
+                         [('off', 1), ('level', 2), ('on', 3)])
+
+    def test_control_not_bounded(self):
+        queue = queues.MessageQueue(1, queues.POLICY_BLOCK)
+        queue.put_nowait(evt('a'))
+        queue.put_nowait(Message(MESSAGE_STOP, None, None))
+        self.assertEqual(queue.qsize(), 2)
+        with self.assertRaises(asyncio.QueueFull):
+            queue.put_nowait(evt('b'))
+
+    def test_block(self):
+        queue = queues.MessageQueue(1, queues.POLICY_BLOCK)
+
+        async def consume():
+            await asyncio.sleep(0.1)
+            return await queue.get()
+
+        async def produce():
+            await queue.put(evt('a', 0))
+            await queue.put(evt('a', 1))
+
+        self.complete(produce(), consume())
+        self.assertEqual(queue.get_nowait().data, 1)
+        self.assertEqual(queue.blocked, 1)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            queues.MessageQueue(1, 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import unittest
+
+from athome.lib.routing import EventRouter
+
+
+class EventRouterTest(unittest.TestCase):
+    """Test event name index"""
+
+    def setUp(self):
+        self.router = EventRouter()
+
+    def test_exact(self):
+        self.router.subscribe('http_started', 'a')
+        self.router.subscribe('http_started', 'b')
+        self.router.subscribe('http_stopped', 'c')
+        self.assertEqual(list(self.router.lookup('http_started')), ['a', 'b'])
+        self.assertEqual(list(self.router.lookup('http_stopped')), ['c'])
+        self.assertFalse(self.router.lookup('athome_started'))
+
+    def test_subscribe_twice(self):
+        self.router.subscribe('http_started', 'a')
+        self.router.subscribe('http_started', 'a')
+        self.assertEqual(list(self.router.lookup('http_started')), ['a'])
+
+    def test_unsubscribe(self):
+        self.router.subscribe('http_started', 'a')
+        self.router.subscribe('http_stopped', 'a')
+        self.router.subscribe('http_stopped', 'b')
+        self.router.unsubscribe('http_started', 'a')
+        self.assertFalse(self.router.lookup('http_started'))
+        self.router.unsubscribe_all('a')
+        self.assertEqual(list(self.router.lookup('http_stopped')), ['b'])
+
+    def test_prefix(self):
+        self.router.subscribe('http_*', 'a')
+        self.router.subscribe('http_started', 'b')
+        self.assertEqual(list(self.router.lookup('http_started')), ['b', 'a'])
+        self.assertEqual(list(self.router.lookup('http_stopped')), ['a'])
+        self.assertFalse(self.router.lookup('mqttbridge_started'))
+
+    def test_suffix(self):
+        self.router.subscribe('*_stopped', 'a')
+        self.assertEqual(list(self.router.lookup('http_stopped')), ['a'])
+        self.assertEqual(list(self.router.lookup('mqttbridge_stopped')), ['a'])
+        self.assertFalse(self.router.lookup('http_started'))
+
+    def test_wildcard(self):
+        self.router.subscribe('*', 'a')
+        self.router.subscribe('http_*', 'a')
+        self.assertEqual(list(self.router.lookup('athome_shutdown')), ['a'])
+        self.assertEqual(list(self.router.lookup('http_started')), ['a'])
+
+    def test_unsubscribe_pattern(self):
+        self.router.subscribe('http_*', 'a')
+        self.router.subscribe('*_stopped', 'a')
+        self.router.subscribe('*_stopped', 'b')
+        self.router.unsubscribe('http_*', 'a')
+        self.assertEqual(list(self.router.lookup('http_stopped')), ['a', 'b'])
+        self.router.unsubscribe_all('a')
+        self.assertEqual(list(self.router.lookup('http_stopped')), ['b'])
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(ValueError):
+            self.router.subscribe('http_*_started', 'a')
+        with self.assertRaises(ValueError):
+            self.router.subscribe('*http*', 'a')
+
+    def test_memo_bounded(self):
+        router = EventRouter(memo_size=3)
+        router.subscribe('sensor_*', 'a')
+        for index in range(10):
+            self.assertEqual(router.lookup('sensor_{}'.format(index)), ('a',))
+            self.assertLessEqual(len(router._memo), 3)
+        self.assertEqual(router.lookup('sensor_9'), ('a',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# Copyright (c) 2017 Alessandro Duca
+#
+# See the file LICENCE for copying permission.
+
+"""
+"""
+
+import asyncio
+import unittest
+
+from test import common
+from athome import Message, MESSAGE_EVT, MESSAGE_SHUTDOWN
+from athome.subsystem import SubsystemModule
+
+
+class Recorder(SubsystemModule):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.batches = []
+
+    async def on_messages(self, batch):
+        self.batches.append([msg.value for msg in batch])
+
+    async def on_message(self, msg):
+        self.batches.append(msg.value)
+
+
+def evt(name):
+    return Message(MESSAGE_EVT, name, None)
+
+
+class MessageCycleTest(common.SubsystemTest):
+    """Test single and batched message delivery"""
+
+    def setUp(self):
+        super().setUp()
+        self.subsystem = Recorder('recorder')
+        self.modules.append(self.subsystem)
+
+    def deliver(self, *names):
+        for name in names:
+            self.subsystem.message_queue.put_nowait(evt(name) if name else
+                                                    Message(MESSAGE_SHUTDOWN, None, None))
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def test_single(self):
+        self.deliver('a', 'b', None, 'c')
+        self.assertEqual(self.subsystem.batches, ['a', 'b', None])
+        self.assertEqual(self.subsystem.message_queue.qsize(), 1)
+
+    def test_batch(self):
+        self.subsystem.configure_queue(batch=4)
+        self.deliver('a', 'b', 'c', 'd', 'e', None, 'f')
+        self.assertEqual(self.subsystem.batches,
+                         [['a', 'b', 'c', 'd'], ['e', None]])
+        self.assertEqual(self.subsystem.message_queue.qsize(), 1)
+
+    def test_batch_waits(self):
+        self.subsystem.configure_queue(batch=4)
+        self.deliver('a')
+        self.deliver('b', 'c')
+        self.assertEqual(self.subsystem.batches, [['a'], ['b', 'c']])
+
+    def test_default_on_messages(self):
+        calls = []
+
+        async def on_message(msg):
+            calls.append(msg.value)
+
+        self.subsystem.on_message = on_message
+        batch = [evt('a'), evt('b')]
+        self.loop.run_until_complete(SubsystemModule.on_messages(self.subsystem, batch))
+        self.assertEqual(calls, ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()